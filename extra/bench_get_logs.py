@@ -0,0 +1,176 @@
+#!/usr/bin/env python
+
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import resource
+import tempfile
+import subprocess
+from datetime import datetime, timedelta
+
+from fake_elastic import FakeElasticsearch, FakeElasticsearchServer, SyntheticLogStore
+from get_logs_from_elastic import (
+    collect_logs,
+    collect_logs_composite,
+    collect_logs_msearch,
+    collect_logs_per_bucket,
+    iter_event_records,
+    load_ignore_list,
+    read_ndjson,
+    write_ndjson,
+)
+
+
+# Параметры синтетических данных по умолчанию
+N_DOCS = 1_000_000
+N_EVENT_TYPES = 400
+N_HOSTS = 2000
+
+# Задержка сети на один запрос (секунды) для режима --in-process
+LATENCY = 0.002
+
+INDEX = "fake-index"
+
+
+def collect_composite_ndjson(es, index, since, until, ignore_list):
+    """Потоковая выгрузка в NDJSON, как в get_logs_from_elastic.py --format ndjson."""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "logs.ndjson")
+        write_ndjson(iter_event_records(es, index, since, until, ignore_list), path)
+        # Пиковая память фиксируется до чтения результата обратно
+        peak_rss = _peak_rss_mb()
+        return list(read_ndjson(path)), peak_rss
+
+
+# Режимы экстрактора: имя -> функция collect(es, index, since, until, ignore_list)
+MODES = {
+    "per-bucket": collect_logs_per_bucket,
+    "terms": collect_logs,
+    "composite": collect_logs_composite,
+    "msearch": collect_logs_msearch,
+    "composite-ndjson": collect_composite_ndjson,
+}
+
+
+def _peak_rss_mb() -> float:
+    """Пиковый RSS текущего процесса в мегабайтах (ru_maxrss: КБ в Linux, байты в macOS)."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1 << 20) if sys.platform == "darwin" else peak / 1024
+
+
+def _digest(records: list) -> str:
+    """Отпечаток результата, не зависящий от порядка записей."""
+    records = sorted(records, key=lambda x: x["event_type"])
+    return hashlib.sha256(json.dumps(records, sort_keys=True).encode("utf-8")).hexdigest()[:12]
+
+
+def measure(mode: str, es, since: datetime, until: datetime) -> dict:
+    ignore_list = load_ignore_list()
+    started = time.perf_counter()
+    result = MODES[mode](es, INDEX, since, until, ignore_list)
+    elapsed = time.perf_counter() - started
+    if isinstance(result, tuple):
+        result, peak_rss = result
+    else:
+        peak_rss = _peak_rss_mb()
+    return {
+        "mode": mode,
+        "time": elapsed,
+        "peak_rss_mb": peak_rss,
+        "records": len(result),
+        "digest": _digest(result),
+    }
+
+
+def run_worker(args):
+    """Дочерний процесс: настоящий клиент Elasticsearch против фейкового сервера."""
+    from elasticsearch import Elasticsearch
+
+    es = Elasticsearch(args.url, request_timeout=600)
+    until = datetime.fromisoformat(args.now)
+    print(json.dumps(measure(args.worker, es, until - timedelta(hours=24), until)))
+
+
+def run_subprocess(mode: str, server: FakeElasticsearchServer, now: datetime) -> dict:
+    """Запускает режим в отдельном процессе, чтобы пиковый RSS относился только к экстрактору."""
+    requests_before = server.request_count
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--worker", mode, "--url", server.url, "--now", now.isoformat()],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    result["requests"] = server.request_count - requests_before
+    return result
+
+
+def run_in_process(mode: str, store: SyntheticLogStore, now: datetime) -> dict:
+    """Запускает режим в текущем процессе без HTTP; RSS включает само хранилище."""
+    es = FakeElasticsearch(store, latency=LATENCY)
+    result = measure(mode, es, now - timedelta(hours=24), now)
+    result["requests"] = es.request_count
+    return result
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark get_logs_from_elastic.py against a fake Elasticsearch")
+    parser.add_argument("--docs", type=int, default=N_DOCS)
+    parser.add_argument("--event-types", type=int, default=N_EVENT_TYPES)
+    parser.add_argument("--hosts", type=int, default=N_HOSTS)
+    parser.add_argument(
+        "--modes",
+        nargs="+",
+        choices=list(MODES),
+        default=["terms", "composite", "msearch", "composite-ndjson"],
+        help="per-bucket makes one request per event_type/hostname pair and is slow on large data",
+    )
+    parser.add_argument(
+        "--in-process",
+        action="store_true",
+        help="call the fake client directly instead of the HTTP server (no elasticsearch package needed)",
+    )
+    parser.add_argument("--worker", choices=list(MODES), help=argparse.SUPPRESS)
+    parser.add_argument("--url", help=argparse.SUPPRESS)
+    parser.add_argument("--now", help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.worker:
+        run_worker(args)
+        return
+
+    now = datetime.utcnow().replace(microsecond=0)
+    started = time.perf_counter()
+    store = SyntheticLogStore.generate(args.docs, args.event_types, args.hosts, now=now)
+    print(
+        f"==> docs: {store.n_docs}, event types: {args.event_types}, hosts: {args.hosts}, "
+        f"pairs: {len(store.pairs)}, generated in {time.perf_counter() - started:.1f} s\n"
+    )
+
+    results = []
+    if args.in_process:
+        for mode in args.modes:
+            results.append(run_in_process(mode, store, now))
+    else:
+        with FakeElasticsearchServer(store) as server:
+            for mode in args.modes:
+                results.append(run_subprocess(mode, server, now))
+
+    print(f"{'mode':<18}{'requests':>10}{'time, s':>10}{'peak RSS, MB':>14}{'records':>10}  digest")
+    for result in results:
+        print(
+            f"{result['mode']:<18}{result['requests']:>10}{result['time']:>10.2f}"
+            f"{result['peak_rss_mb']:>14.1f}{result['records']:>10}  {result['digest']}"
+        )
+
+    print(f"\n==> results are identical: {len({result['digest'] for result in results}) == 1}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,433 @@
+#!/usr/bin/env python
+
+import json
+import random
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+# Примеры сообщений для синтетических syslog-документов
+SAMPLE_MESSAGES = [
+    "Received BPDU on port GigabitEthernet1/0/{n} with BPDU Guard enabled. Disabling port.",
+    "Interface GigabitEthernet1/0/{n}, changed state to down",
+    "bad id in id_get (Out of IDs!) (id: 0x{n:x})",
+    "Te1/{n}: Rx power high warning; Operating value: -{n}.5 dBm",
+    "Task ran for {n}ms, process = IP Input",
+    "Host aabb.cc00.{n:04d} in vlan 10 is flapping between port Gi1/0/1 and port Gi1/0/2",
+]
+
+# Шумные event_type из ignore_list, чтобы было что отфильтровывать
+NOISY_EVENT_TYPES = ["LINK-3-UPDOWN", "LINEPROTO-5-UPDOWN", "SYS-6-LOGOUT", "SSH-5-SSH2_SESSION"]
+
+# Сколько последних результатов разбора query держать в памяти
+QUERY_CACHE_SIZE = 16
+
+
+def _to_epoch(value: str) -> float:
+    """ISO-время без часового пояса (как у datetime.utcnow().isoformat()) -> epoch."""
+    return datetime.fromisoformat(value).replace(tzinfo=timezone.utc).timestamp()
+
+
+def _to_iso(epoch: float) -> str:
+    return datetime.fromtimestamp(epoch, timezone.utc).replace(tzinfo=None).isoformat()
+
+
+class SyntheticLogStore:
+    """
+    Компактное хранилище синтетических syslog-документов.
+
+    Документы не хранятся по отдельности: для каждой пары (event_type, hostname)
+    лежат отсортированные метки времени и номера сообщений в array, поэтому
+    миллионы документов занимают десятки мегабайт. Счетчики в окне времени
+    и последнее сообщение считаются бинарным поиском.
+    """
+
+    def __init__(self, event_types: list, hosts: list, messages: list, pairs: dict):
+        self.event_types = event_types
+        self.hosts = hosts
+        self.messages = messages
+        # {(event_id, host_id): (array меток времени, array номеров сообщений)}
+        self.pairs = pairs
+        self.n_docs = sum(len(timestamps) for timestamps, _ in pairs.values())
+        # Пары по event_type и hostname, чтобы запросы с term не перебирали все пары
+        self._event_ids = {name: i for i, name in enumerate(event_types)}
+        self._host_ids = {name: i for i, name in enumerate(hosts)}
+        self._by_event = {}
+        self._by_host = {}
+        for key in pairs:
+            self._by_event.setdefault(key[0], []).append(key)
+            self._by_host.setdefault(key[1], []).append(key)
+        self._query_cache = {}
+        self._cache_lock = threading.Lock()
+
+    @classmethod
+    def generate(
+        cls,
+        n_docs: int,
+        n_event_types: int,
+        n_hosts: int,
+        hours: int = 24,
+        seed: int = 42,
+        now: datetime = None,
+    ):
+        """
+        Генерирует n_docs документов в окне [now - hours, now].
+
+        Частоты event_type и hostname распределены по степенному закону, как
+        в реальной сети: несколько шумных событий и длинный хвост редких.
+        Около 10% event_type — шумные события из ignore_list.
+        """
+        rng = random.Random(seed)
+        now = now or datetime.utcnow()
+        end = int(_to_epoch(now.isoformat()))
+        start = end - hours * 3600 + 1
+
+        noisy = NOISY_EVENT_TYPES[:n_event_types // 10]
+        event_types = noisy + [
+            f"FAC{i}-{rng.randint(1, 6)}-MNEMONIC_{i}" for i in range(n_event_types - len(noisy))
+        ]
+        hosts = [f"10.{i // 65536 % 256}.{i // 256 % 256}.{i % 256}" for i in range(n_hosts)]
+        messages = [template.format(n=n) for template in SAMPLE_MESSAGES for n in range(1, 49)]
+
+        event_weights = [1 / (i + 1) for i in range(n_event_types)]
+        host_weights = [1 / (i + 1) ** 0.5 for i in range(n_hosts)]
+
+        raw = {}
+        batch = 100000
+        for offset in range(0, n_docs, batch):
+            k = min(batch, n_docs - offset)
+            event_ids = rng.choices(range(n_event_types), event_weights, k=k)
+            host_ids = rng.choices(range(n_hosts), host_weights, k=k)
+            for key in zip(event_ids, host_ids):
+                if key not in raw:
+                    raw[key] = []
+                raw[key].append((rng.randint(start, end), rng.randrange(len(messages))))
+
+        # Пары в порядке (event_type, hostname), как их отдает composite-агрегация
+        pairs = {}
+        for key in sorted(raw, key=lambda key: (event_types[key[0]], hosts[key[1]])):
+            docs = raw[key]
+            docs.sort()
+            pairs[key] = (array("q", [ts for ts, _ in docs]), array("H", [m for _, m in docs]))
+        return cls(event_types, hosts, messages, pairs)
+
+    # ---------------------------- QUERY ----------------------------
+
+    def _compile(self, query: dict) -> dict:
+        """
+        Разбирает подмножество Query DSL, которое формирует экстрактор:
+        bool с filter/must (range, term, terms) и must_not (term, terms).
+        """
+        spec = {
+            "low": float("-inf"), "low_inclusive": True,
+            "high": float("inf"), "high_inclusive": True,
+            "events": None, "hosts": None, "exclude_events": set(),
+        }
+
+        def as_list(value):
+            return value if isinstance(value, list) else [value]
+
+        def values_of(clause):
+            if "term" in clause:
+                field, value = next(iter(clause["term"].items()))
+                if isinstance(value, dict):
+                    value = value["value"]
+                return field, {value}
+            field, values = next(iter(clause["terms"].items()))
+            return field, set(values)
+
+        def apply(clause):
+            if not clause or "match_all" in clause:
+                return
+            if "bool" in clause:
+                for key in ("filter", "must"):
+                    for sub in as_list(clause["bool"].get(key, [])):
+                        apply(sub)
+                for sub in as_list(clause["bool"].get("must_not", [])):
+                    field, values = values_of(sub)
+                    if field != "dissect.event_type":
+                        raise ValueError(f"Unsupported must_not field: {field}")
+                    spec["exclude_events"] |= values
+                return
+            if "range" in clause:
+                _, bounds = next(iter(clause["range"].items()))
+                for op, value in bounds.items():
+                    epoch = _to_epoch(value)
+                    if op in ("gte", "gt"):
+                        spec["low"], spec["low_inclusive"] = epoch, op == "gte"
+                    else:
+                        spec["high"], spec["high_inclusive"] = epoch, op == "lte"
+                return
+            if "term" in clause or "terms" in clause:
+                field, values = values_of(clause)
+                key = {"dissect.event_type": "events", "dissect.hostname": "hosts"}[field]
+                spec[key] = values if spec[key] is None else spec[key] & values
+                return
+            raise ValueError(f"Unsupported query: {clause}")
+
+        apply(query)
+        return spec
+
+    def _matching_pairs(self, spec: dict) -> list:
+        """
+        Возвращает [(event_type, hostname, doc_count, latest)] для пар, у которых
+        есть документы в окне. latest — (timestamp, message) последнего из них.
+        """
+        if spec["events"] is not None and spec["hosts"] is not None:
+            keys = [
+                (self._event_ids[event], self._host_ids[host])
+                for event in spec["events"] if event in self._event_ids
+                for host in spec["hosts"] if host in self._host_ids
+            ]
+            keys = [key for key in keys if key in self.pairs]
+        elif spec["events"] is not None:
+            keys = [
+                key for name in spec["events"] if name in self._event_ids
+                for key in self._by_event.get(self._event_ids[name], [])
+            ]
+        elif spec["hosts"] is not None:
+            keys = [
+                key for name in spec["hosts"] if name in self._host_ids
+                for key in self._by_host.get(self._host_ids[name], [])
+            ]
+        else:
+            keys = self.pairs
+
+        result = []
+        for event_id, host_id in keys:
+            timestamps, message_ids = self.pairs[(event_id, host_id)]
+            event_type = self.event_types[event_id]
+            hostname = self.hosts[host_id]
+            if event_type in spec["exclude_events"]:
+                continue
+            if spec["events"] is not None and event_type not in spec["events"]:
+                continue
+            if spec["hosts"] is not None and hostname not in spec["hosts"]:
+                continue
+
+            if spec["low_inclusive"]:
+                lo = bisect_left(timestamps, spec["low"])
+            else:
+                lo = bisect_right(timestamps, spec["low"])
+            if spec["high_inclusive"]:
+                hi = bisect_right(timestamps, spec["high"])
+            else:
+                hi = bisect_left(timestamps, spec["high"])
+            if hi > lo:
+                latest = (timestamps[hi - 1], self.messages[message_ids[hi - 1]])
+                result.append((event_type, hostname, hi - lo, latest))
+        return result
+
+    def _cached_pairs(self, query: dict) -> list:
+        """
+        _matching_pairs с кешем по тексту запроса: страницы composite-агрегации
+        повторяют один и тот же query и не должны каждый раз перебирать все пары.
+        """
+        key = json.dumps(query, sort_keys=True)
+        rows = self._query_cache.get(key)
+        if rows is None:
+            rows = self._matching_pairs(self._compile(query))
+            with self._cache_lock:
+                if len(self._query_cache) >= QUERY_CACHE_SIZE:
+                    self._query_cache.pop(next(iter(self._query_cache)))
+                self._query_cache[key] = rows
+        return rows
+
+    @staticmethod
+    def _hit(event_type: str, hostname: str, latest: tuple) -> dict:
+        timestamp, message = latest
+        return {
+            "_source": {
+                "@timestamp": _to_iso(timestamp),
+                "dissect": {"event_type": event_type, "hostname": hostname, "message": message},
+            }
+        }
+
+    def _top_hits(self, rows: list, size: int) -> dict:
+        """Последние документы по @timestamp — единственная сортировка, которая нужна экстрактору."""
+        rows = sorted(rows, key=lambda row: row[3][0], reverse=True)[:size]
+        return {"hits": {"hits": [self._hit(row[0], row[1], row[3]) for row in rows]}}
+
+    def _aggregate(self, rows: list, aggs: dict) -> dict:
+        result = {}
+        for name, spec in aggs.items():
+            sub_aggs = spec.get("aggs", {})
+            if "terms" in spec:
+                position = 0 if spec["terms"]["field"] == "dissect.event_type" else 1
+                groups = {}
+                for row in rows:
+                    groups.setdefault(row[position], []).append(row)
+                counted = [(key, sum(row[2] for row in group), group) for key, group in groups.items()]
+                counted.sort(key=lambda kv: (-kv[1], kv[0]))
+                buckets = []
+                for key, doc_count, group in counted[:spec["terms"].get("size", 10)]:
+                    bucket = {"key": key, "doc_count": doc_count}
+                    bucket.update(self._aggregate(group, sub_aggs))
+                    buckets.append(bucket)
+                result[name] = {"buckets": buckets}
+            elif "composite" in spec:
+                composite = spec["composite"]
+                names = [next(iter(source)) for source in composite["sources"]]
+                # rows уже почти упорядочены, поэтому сортировка линейная
+                ordered = sorted(rows, key=lambda row: (row[0], row[1]))
+                if "after" in composite:
+                    after = (composite["after"][names[0]], composite["after"][names[1]])
+                    ordered = ordered[bisect_right(ordered, after, key=lambda row: (row[0], row[1])):]
+                buckets = []
+                for row in ordered[:composite.get("size", 10)]:
+                    bucket = {"key": {names[0]: row[0], names[1]: row[1]}, "doc_count": row[2]}
+                    bucket.update(self._aggregate([row], sub_aggs))
+                    buckets.append(bucket)
+                result[name] = {"buckets": buckets}
+                if buckets:
+                    result[name]["after_key"] = buckets[-1]["key"]
+            elif "top_hits" in spec:
+                result[name] = self._top_hits(rows, spec["top_hits"].get("size", 3))
+            else:
+                raise ValueError(f"Unsupported aggregation: {spec}")
+        return result
+
+    def search(self, body: dict) -> dict:
+        """Выполняет тело запроса _search и возвращает ответ в формате Elasticsearch."""
+        rows = self._cached_pairs(body.get("query"))
+        size = body.get("size", 10)
+        response = {
+            "took": 1,
+            "timed_out": False,
+            "hits": {
+                "total": {"value": sum(row[2] for row in rows), "relation": "eq"},
+                "hits": self._top_hits(rows, size)["hits"]["hits"] if size else [],
+            },
+        }
+        if body.get("aggs"):
+            response["aggregations"] = self._aggregate(rows, body["aggs"])
+        return response
+
+
+class FakeElasticsearch:
+    """
+    Подмена клиента Elasticsearch в том же процессе.
+
+    Реализует search() и msearch() поверх SyntheticLogStore. request_count —
+    число запросов, latency — искусственная задержка на запрос (секунды),
+    чтобы учесть сетевой round trip.
+    """
+
+    def __init__(self, store: SyntheticLogStore, latency: float = 0.0):
+        self.store = store
+        self.latency = latency
+        self.request_count = 0
+        self._lock = threading.Lock()
+
+    def _request(self):
+        with self._lock:
+            self.request_count += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def search(self, index=None, **body):
+        self._request()
+        return self.store.search(body)
+
+    def msearch(self, searches=None, **kwargs):
+        """Пары (заголовок, тело) выполняются как один запрос."""
+        self._request()
+        return {"responses": [self.store.search(body) for body in searches[1::2]]}
+
+
+class FakeElasticsearchServer:
+    """
+    HTTP-сервер, отвечающий на _search и _msearch как Elasticsearch 8.
+
+    Работает в фоновом потоке текущего процесса, поэтому экстрактор можно
+    запускать настоящим клиентом elasticsearch, в том числе из другого
+    процесса, по адресу url. request_count — число обработанных запросов.
+    """
+
+    def __init__(self, store: SyntheticLogStore, host: str = "127.0.0.1", port: int = 0):
+        self.store = store
+        self.request_count = 0
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), self._handler())
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, payload: dict, status: int = 200):
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("X-Elastic-Product", "Elasticsearch")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_HEAD(self):
+                self.send_response(200)
+                self.send_header("X-Elastic-Product", "Elasticsearch")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def do_GET(self):
+                if self.path.split("?")[0].endswith(("/_search", "/_msearch")):
+                    return self.do_POST()
+                self._reply({
+                    "name": "fake-elastic",
+                    "cluster_name": "fake",
+                    "version": {"number": "8.13.0"},
+                    "tagline": "You Know, for Search",
+                })
+
+            def do_POST(self):
+                path = self.path.split("?")[0]
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length) if length else b""
+                with server._lock:
+                    server.request_count += 1
+                try:
+                    if path.endswith("/_msearch"):
+                        lines = [json.loads(line) for line in body.splitlines() if line.strip()]
+                        responses = [server.store.search(search) for search in lines[1::2]]
+                        self._reply({"took": 1, "responses": responses})
+                    elif path.endswith("/_search"):
+                        self._reply(server.store.search(json.loads(body) if body else {}))
+                    else:
+                        self._reply({"error": f"unsupported path {path}"}, status=404)
+                except (ValueError, KeyError) as error:
+                    self._reply(
+                        {"error": {"type": "parsing_exception", "reason": str(error)}, "status": 400},
+                        status=400,
+                    )
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
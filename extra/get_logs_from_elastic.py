@@ -1,42 +1,569 @@
 #!/usr/bin/env python
 
 import os
+import io
+import gzip
 import json
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from elasticsearch import Elasticsearch
 
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
 
-def main():
 
-    es = Elasticsearch("http://10.1.1.1:9200")
-    index = ".ds-filebeat-*"
-
-    ignore_list = [
-        "DOT1X-5-FAIL", "LINEPROTO-5-UPDOWN", "LINEPROTO-3-UPDOWN",
-        "LINK-3-UPDOWN", "LINK-5-UPDOWN", "ILPOWER-5-IEEE_DISCONNECT",
-        "ILPOWER-5-POWER_GRANTED", "SEC_LOGIN-5-LOGIN_SUCCESS", "SYS-6-LOGOUT",
-        "SSH-3-NO_MATCH", "SSH-5-SSH2_CLOSE", "SSH-5-SSH2_SESSION",
-        "SSH-5-SSH2_USERAUTH", "ILPOWER-5-DETECT", "SSH-3-DH_SIZE", "MAB-5-FAIL",
-        "SW_MATM-4-MACFLAP_NOTIF", "MAB-5-SUCCESS", "EPM-6-IPEVENT",
-        "EPM-6-POLICY_APP_SUCCESS", "IPPHONE-6-UNREGISTER_NORMAL",
-        "SYS-5-CONFIG_I", "LINK-5-CHANGED", "SYS-6-TTY_EXPIRE_TIMER",
-        "AAAA-4-CLI_DEPRECATED", "SYS-6-CLOCKUPDATE"
-    ]
+ES_URL = "http://10.1.1.1:9200"
+INDEX = ".ds-filebeat-*"
+
+# Число бакетов (event_type, hostname) в одной странице composite-агрегации
+COMPOSITE_PAGE_SIZE = 1000
+
+# Режим msearch: запросов в одном _msearch и число параллельных _msearch
+MSEARCH_BATCH_SIZE = 200
+MSEARCH_PARALLELISM = 4
+
+# Запросы _msearch, завершившиеся ошибкой (отказ шарда, 429), повторяются
+# до MSEARCH_RETRIES раз с задержкой MSEARCH_RETRY_DELAY секунд, удваивающейся каждый раз
+MSEARCH_RETRIES = 3
+MSEARCH_RETRY_DELAY = 1.0
+
+# Файлы результата и контрольной точки инкрементальной выгрузки
+RESULTS_PATH = "results/logs.json"
+CHECKPOINT_PATH = "results/checkpoint.json"
+
+# Расширения сжатых NDJSON-файлов
+COMPRESS_SUFFIXES = {"none": "", "gzip": ".gz", "zstd": ".zst"}
+
+# Окно выгрузки отстает от текущего времени, чтобы успели доиндексироваться поздние документы
+INGEST_LAG = timedelta(minutes=1)
+
+# Окно выгрузки. Инкрементальные запуски добавляют новые документы к результату,
+# но не вычитают вышедшие из окна (счетчики не разбиты по времени), поэтому
+# результат покрывает от WINDOW до WINDOW + INCREMENTAL_MAX_OVERHANG: когда
+# старая часть становится длиннее, выполняется полная выгрузка за WINDOW
+WINDOW = timedelta(hours=24)
+INCREMENTAL_MAX_OVERHANG = timedelta(hours=1)
+
+# Список игнорируемых event_type, одно значение на строку
+IGNORE_LIST_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "ignore_list.txt")
+
+
+def load_ignore_list(path: str = IGNORE_LIST_PATH) -> list:
+    """Читает игнорируемые event_type из файла, пропуская пустые строки и комментарии (#)."""
+    with open(path, "r", encoding="utf-8") as f:
+        return [
+            line.strip() for line in f
+            if line.strip() and not line.lstrip().startswith("#")
+        ]
+
+
+def time_range_query(since: datetime, until: datetime, include_since: bool = True) -> dict:
+    return {
+        "range": {
+            "@timestamp": {
+                "gte" if include_since else "gt": since.isoformat(),
+                "lte": until.isoformat()
+            }
+        }
+    }
+
+
+def build_query(since: datetime, until: datetime, ignore_list: list, include_since: bool = True) -> dict:
+    """
+    Запрос за окно времени без игнорируемых event_type.
+
+    ignore_list передается в must_not, поэтому шумные события отсекаются
+    на стороне кластера и не попадают ни в агрегации, ни в ответ.
+    """
+    query = {"bool": {"filter": [time_range_query(since, until, include_since)]}}
+    if ignore_list:
+        query["bool"]["must_not"] = [{"terms": {"dissect.event_type": list(ignore_list)}}]
+    return query
+
+
+def _read_checkpoints(path: str) -> dict:
+    """Контрольные точки всех файлов результата: {results_path: {"window_start", "high_water_mark"}}."""
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        # В файле старого формата одна точка без пути результата — ее не используем
+        return json.load(f).get("files", {})
+
+
+def load_checkpoint(results_path: str, path: str = CHECKPOINT_PATH):
+    """
+    Возвращает (window_start, high_water_mark) прошлой выгрузки в results_path или None.
+
+    Результат содержит документы с window_start по high_water_mark. У каждого
+    файла результата (json, ndjson, сжатые варианты) своя контрольная точка.
+    """
+    checkpoint = _read_checkpoints(path).get(results_path)
+    if checkpoint is None:
+        return None
+    return (
+        datetime.fromisoformat(checkpoint["window_start"]),
+        datetime.fromisoformat(checkpoint["high_water_mark"]),
+    )
+
+
+def save_checkpoint(
+    results_path: str,
+    window_start: datetime,
+    high_water_mark: datetime,
+    path: str = CHECKPOINT_PATH,
+) -> None:
+    """Атомарно сохраняет окно записанного results_path: документы до high_water_mark уже учтены."""
+    checkpoints = _read_checkpoints(path)
+    checkpoints[results_path] = {
+        "window_start": window_start.isoformat(),
+        "high_water_mark": high_water_mark.isoformat(),
+    }
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"files": checkpoints}, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def merge_record(target: dict, log: dict) -> dict:
+    """
+    Добавляет счетчики записи log к записи target того же event_type.
+
+    Счетчики event_type и устройств складываются, пример сообщения берется
+    из log как более свежий.
+    """
+    target["count"] += log["count"]
+    items = {item["ip"]: item for item in target["items"]}
+    for item in log["items"]:
+        if item["ip"] in items:
+            items[item["ip"]]["count"] += item["count"]
+            if item["message"]:
+                items[item["ip"]]["message"] = item["message"]
+        else:
+            target["items"].append(item)
+    target["items"].sort(key=lambda x: x["count"], reverse=True)
+    return target
+
+
+def merge_logs(existing: list, new: list) -> list:
+    """
+    Добавляет счетчики новой выгрузки к уже агрегированным логам (см. merge_record()).
+
+    Счетчики только накапливаются: документы, вышедшие из окна, из них не
+    вычитаются. Длину покрытого периода ограничивает main() (INCREMENTAL_MAX_OVERHANG).
+    """
+    merged = {log["event_type"]: log for log in existing}
+    for log in new:
+        if log["event_type"] in merged:
+            merge_record(merged[log["event_type"]], log)
+        else:
+            merged[log["event_type"]] = log
+
+    result = list(merged.values())
+    result.sort(key=lambda x: x["count"], reverse=True)
+    return result
+
+
+def merge_sorted_records(existing, new):
+    """
+    Потоковый вариант merge_logs() для двух последовательностей,
+    отсортированных по event_type. В памяти держится по одной записи из каждой.
+    """
+    existing = iter(existing)
+    new = iter(new)
+    left = next(existing, None)
+    right = next(new, None)
+    while left is not None or right is not None:
+        if right is None or (left is not None and left["event_type"] < right["event_type"]):
+            yield left
+            left = next(existing, None)
+        elif left is None or right["event_type"] < left["event_type"]:
+            yield right
+            right = next(new, None)
+        else:
+            yield merge_record(left, right)
+            left = next(existing, None)
+            right = next(new, None)
+
+
+def open_ndjson(path: str, mode: str):
+    """
+    Открывает NDJSON-файл на чтение ("r") или запись ("w") в текстовом режиме.
+
+    Сжатие определяется по расширению: .gz — gzip, .zst — zstd.
+    """
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    if path.endswith(".zst"):
+        if zstandard is None:
+            raise RuntimeError("Для .zst установите пакет zstandard")
+        raw = open(path, mode + "b")
+        if mode == "w":
+            stream = zstandard.ZstdCompressor().stream_writer(raw)
+        else:
+            stream = zstandard.ZstdDecompressor().stream_reader(raw)
+        return io.TextIOWrapper(stream, encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
 
-    now = datetime.utcnow()
-    yesterday = now - timedelta(hours=24)
+def write_ndjson(records, path: str) -> int:
+    """Потоково записывает записи по одной на строку. Возвращает число записей."""
+    count = 0
+    with open_ndjson(path, "w") as f:
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False))
+            f.write("\n")
+            count += 1
+    return count
 
+
+def read_ndjson(path: str):
+    """Лениво читает записи из NDJSON-файла (в том числе сжатого)."""
+    with open_ndjson(path, "r") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def collect_logs(es, index: str, since: datetime, until: datetime, ignore_list: list) -> list:
+    """
+    Агрегирует логи по event_type и hostname одним запросом, без event_type из ignore_list.
+
+    Последнее сообщение для каждой пары (event_type, hostname) берется
+    через top_hits внутри агрегации, без отдельного запроса на каждый бакет.
+    Число event_type и hostname ограничено size terms-агрегаций (1000),
+    без ограничений работает collect_logs_composite().
+    """
     response = es.search(
         index=index,
         size=0,
-        query={
-            "range": {
-                "@timestamp": {
-                    "gte": yesterday.isoformat(),
-                    "lte": now.isoformat()
+        query=build_query(since, until, ignore_list),
+        aggs={
+            "event_types": {
+                "terms": {
+                    "field": "dissect.event_type",
+                    "size": 1000
+                },
+                "aggs": {
+                    "source_ips": {
+                        "terms": {
+                            "field": "dissect.hostname",
+                            "size": 1000
+                        },
+                        "aggs": {
+                            "latest": {
+                                "top_hits": {
+                                    "size": 1,
+                                    "sort": [{"@timestamp": {"order": "desc"}}],
+                                    "_source": {"includes": ["dissect.message"]}
+                                }
+                            }
+                        }
+                    }
                 }
             }
-        },
+        }
+    )
+
+    aggregated_logs = []
+
+    for event_bucket in response["aggregations"]["event_types"]["buckets"]:
+        event_type = event_bucket["key"]
+
+        items = []
+        for ip_bucket in event_bucket["source_ips"]["buckets"]:
+            hits = ip_bucket["latest"]["hits"]["hits"]
+            if hits:
+                message = hits[0]["_source"].get("dissect", {}).get("message", "")
+            else:
+                message = ""
+
+            items.append({
+                "ip": ip_bucket["key"],
+                "count": ip_bucket["doc_count"],
+                "message": message
+            })
+
+        aggregated_logs.append({
+            "event_type": event_type,
+            "count": event_bucket["doc_count"],
+            "items": items
+        })
+
+    aggregated_logs.sort(key=lambda x: x["count"], reverse=True)
+    return aggregated_logs
+
+
+def iter_composite_buckets(
+    es,
+    index: str,
+    query: dict,
+    page_size: int = COMPOSITE_PAGE_SIZE,
+    with_examples: bool = True,
+):
+    """
+    Постранично обходит все пары (event_type, hostname) через composite-агрегацию.
+
+    Следующая страница запрашивается с after_key предыдущей, поэтому ни кластер,
+    ни клиент не держат в памяти все бакеты сразу. Бакеты идут в порядке
+    (event_type, hostname). При with_examples=False последнее сообщение
+    не запрашивается (бакеты без "latest").
+    """
+    after_key = None
+    while True:
+        composite = {
+            "size": page_size,
+            "sources": [
+                {"event_type": {"terms": {"field": "dissect.event_type"}}},
+                {"hostname": {"terms": {"field": "dissect.hostname"}}}
+            ]
+        }
+        if after_key:
+            composite["after"] = after_key
+
+        pairs_agg = {"composite": composite}
+        if with_examples:
+            pairs_agg["aggs"] = {
+                "latest": {
+                    "top_hits": {
+                        "size": 1,
+                        "sort": [{"@timestamp": {"order": "desc"}}],
+                        "_source": {"includes": ["dissect.message"]}
+                    }
+                }
+            }
+
+        response = es.search(
+            index=index,
+            size=0,
+            query=query,
+            aggs={"pairs": pairs_agg}
+        )
+
+        pairs = response["aggregations"]["pairs"]
+        yield from pairs["buckets"]
+
+        after_key = pairs.get("after_key")
+        if not after_key or len(pairs["buckets"]) < page_size:
+            return
+
+
+def iter_event_records(
+    es,
+    index: str,
+    since: datetime,
+    until: datetime,
+    ignore_list: list,
+    page_size: int = COMPOSITE_PAGE_SIZE,
+    with_examples: bool = True,
+    include_since: bool = True,
+):
+    """
+    Лениво выдает агрегированные записи {"event_type", "count", "items"}.
+
+    Записи собираются из соседних composite-бакетов одного event_type и
+    отдаются сразу, как только event_type сменился. Порядок — по event_type,
+    items внутри записи — по убыванию count.
+    При with_examples=False поле message у items пустое.
+    """
+    current = None
+    buckets = iter_composite_buckets(
+        es, index, build_query(since, until, ignore_list, include_since), page_size, with_examples
+    )
+    for bucket in buckets:
+        event_type = bucket["key"]["event_type"]
+
+        if current is None or current["event_type"] != event_type:
+            if current is not None:
+                yield _sorted_items(current)
+            current = {"event_type": event_type, "count": 0, "items": []}
+
+        hits = bucket["latest"]["hits"]["hits"] if with_examples else []
+        if hits:
+            message = hits[0]["_source"].get("dissect", {}).get("message", "")
+        else:
+            message = ""
+
+        current["count"] += bucket["doc_count"]
+        current["items"].append({
+            "ip": bucket["key"]["hostname"],
+            "count": bucket["doc_count"],
+            "message": message
+        })
+
+    if current is not None:
+        yield _sorted_items(current)
+
+
+def _sorted_items(record: dict) -> dict:
+    record["items"].sort(key=lambda x: x["count"], reverse=True)
+    return record
+
+
+def collect_logs_composite(
+    es,
+    index: str,
+    since: datetime,
+    until: datetime,
+    ignore_list: list,
+    page_size: int = COMPOSITE_PAGE_SIZE,
+    include_since: bool = True,
+) -> list:
+    """
+    Агрегирует логи через composite-агрегацию без ограничения на число
+    event_type и hostname. Результат в том же формате, что у collect_logs().
+    """
+    aggregated_logs = list(iter_event_records(
+        es, index, since, until, ignore_list, page_size, include_since=include_since
+    ))
+    aggregated_logs.sort(key=lambda x: x["count"], reverse=True)
+    return aggregated_logs
+
+
+def fetch_examples(
+    es,
+    index: str,
+    since: datetime,
+    until: datetime,
+    pairs: list,
+    batch_size: int = MSEARCH_BATCH_SIZE,
+    parallelism: int = MSEARCH_PARALLELISM,
+    include_since: bool = True,
+    stats: dict = None,
+) -> dict:
+    """
+    Получает последнее сообщение для каждой пары (event_type, hostname).
+
+    Запросы объединяются в _msearch по batch_size штук, одновременно
+    выполняется не более parallelism _msearch. Запросы, на которые
+    _msearch вернул ошибку, повторяются (MSEARCH_RETRIES); если ошибка
+    остается, выбрасывается RuntimeError, а не пустое сообщение. Если передан
+    словарь stats, в stats["retried"] записывается число повторенных запросов.
+    Возвращает {(event_type, hostname): message}.
+    """
+    stats = {} if stats is None else stats
+    stats["retried"] = 0
+    stats_lock = threading.Lock()
+
+    def run_batch(batch):
+        messages = {}
+        pending = batch
+        for attempt in range(MSEARCH_RETRIES + 1):
+            failed = run_searches(pending, messages)
+            if not failed:
+                return messages
+            if attempt < MSEARCH_RETRIES:
+                with stats_lock:
+                    stats["retried"] += len(failed)
+                time.sleep(MSEARCH_RETRY_DELAY * 2 ** attempt)
+                pending = [pair for pair, _ in failed]
+        raise RuntimeError(
+            f"_msearch: {len(failed)} запросов завершились ошибкой после {MSEARCH_RETRIES} повторов, "
+            f"например {failed[0][0]}: {failed[0][1]}"
+        )
+
+    def run_searches(batch, messages) -> list:
+        """Выполняет один _msearch, заполняет messages; возвращает [(пара, ошибка)] неудавшихся запросов."""
+        searches = []
+        for event_type, hostname in batch:
+            searches.append({"index": index})
+            searches.append({
+                "size": 1,
+                "query": {
+                    "bool": {
+                        "filter": [
+                            time_range_query(since, until, include_since),
+                            {"term": {"dissect.event_type": event_type}},
+                            {"term": {"dissect.hostname": hostname}}
+                        ]
+                    }
+                },
+                "sort": [{"@timestamp": {"order": "desc"}}],
+                "_source": {"includes": ["dissect.message"]}
+            })
+
+        response = es.msearch(searches=searches)
+
+        failed = []
+        for pair, result in zip(batch, response["responses"]):
+            if "error" in result:
+                failed.append((pair, result["error"]))
+                continue
+            hits = result.get("hits", {}).get("hits", [])
+            if hits:
+                messages[pair] = hits[0]["_source"].get("dissect", {}).get("message", "")
+            else:
+                messages[pair] = ""
+        return failed
+
+    batches = [pairs[i:i + batch_size] for i in range(0, len(pairs), batch_size)]
+    examples = {}
+    with ThreadPoolExecutor(max_workers=parallelism) as executor:
+        for messages in executor.map(run_batch, batches):
+            examples.update(messages)
+    return examples
+
+
+def collect_logs_msearch(
+    es,
+    index: str,
+    since: datetime,
+    until: datetime,
+    ignore_list: list,
+    batch_size: int = MSEARCH_BATCH_SIZE,
+    parallelism: int = MSEARCH_PARALLELISM,
+    timings: dict = None,
+    include_since: bool = True,
+    stats: dict = None,
+) -> list:
+    """
+    Агрегирует логи в две фазы: счетчики через composite-агрегацию без top_hits,
+    затем примеры сообщений пакетными _msearch (см. fetch_examples()).
+
+    Если передан словарь timings, в него записывается длительность фаз (секунды),
+    в stats — число запросов _msearch, повторенных после ошибки.
+    """
+    timings = {} if timings is None else timings
+
+    started = time.perf_counter()
+    aggregated_logs = list(iter_event_records(
+        es, index, since, until, ignore_list,
+        with_examples=False, include_since=include_since
+    ))
+    timings["aggregate"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    pairs = [
+        (log["event_type"], item["ip"])
+        for log in aggregated_logs
+        for item in log["items"]
+    ]
+    examples = fetch_examples(
+        es, index, since, until, pairs, batch_size, parallelism, include_since, stats
+    )
+    for log in aggregated_logs:
+        for item in log["items"]:
+            item["message"] = examples.get((log["event_type"], item["ip"]), "")
+    timings["examples"] = time.perf_counter() - started
+
+    aggregated_logs.sort(key=lambda x: x["count"], reverse=True)
+    return aggregated_logs
+
+
+def collect_logs_per_bucket(es, index: str, since: datetime, until: datetime, ignore_list: list) -> list:
+    """
+    Прежний вариант: отдельный es.search на каждую пару (event_type, hostname),
+    ignore_list проверяется на клиенте.
+
+    Оставлен для сравнения в bench_get_logs.py.
+    """
+    response = es.search(
+        index=index,
+        size=0,
+        query=time_range_query(since, until),
         aggs={
             "event_types": {
                 "terms": {
@@ -102,12 +629,149 @@ def main():
         })
 
     aggregated_logs.sort(key=lambda x: x["count"], reverse=True)
+    return aggregated_logs
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Выгрузка агрегированных логов из Elasticsearch")
+    parser.add_argument(
+        "--mode",
+        choices=["composite", "msearch"],
+        default="composite",
+        help="composite — примеры через top_hits, msearch — отдельной фазой через _msearch",
+    )
+    parser.add_argument(
+        "--ignore-list",
+        default=IGNORE_LIST_PATH,
+        help="файл с игнорируемыми event_type, одно значение на строку",
+    )
+    parser.add_argument("--msearch-batch-size", type=int, default=MSEARCH_BATCH_SIZE)
+    parser.add_argument("--parallelism", type=int, default=MSEARCH_PARALLELISM)
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help=(
+            "выгрузить только документы после контрольной точки и добавить их к результату; "
+            "счетчики накапливаются, пока результат не выйдет за окно 24 ч больше чем на 1 ч, "
+            "тогда выполняется полная выгрузка за 24 ч"
+        ),
+    )
+    parser.add_argument(
+        "--format",
+        choices=["json", "ndjson"],
+        default="json",
+        help="ndjson — потоковая запись по одной записи на строку",
+    )
+    parser.add_argument(
+        "--compress",
+        choices=list(COMPRESS_SUFFIXES),
+        default="none",
+        help="сжатие для --format ndjson",
+    )
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    # Клиент нужен только здесь: функции выгрузки можно импортировать и без пакета elasticsearch
+    from elasticsearch import Elasticsearch
+
+    es = Elasticsearch(ES_URL)
+    ignore_list = load_ignore_list(args.ignore_list)
+
+    if args.format == "ndjson":
+        results_path = "results/logs.ndjson" + COMPRESS_SUFFIXES[args.compress]
+    else:
+        results_path = RESULTS_PATH
+
+    now = datetime.utcnow() - INGEST_LAG
+    since = now - WINDOW
+    window_start = since
+
+    # Инкрементальный режим: только документы после прошлой контрольной точки
+    checkpoint = load_checkpoint(results_path) if args.incremental else None
+    incremental = checkpoint is not None and os.path.exists(results_path)
+    if incremental and now - checkpoint[0] > WINDOW + INCREMENTAL_MAX_OVERHANG:
+        # Счетчики нельзя уменьшить на вышедшие из окна документы — выгружаем окно заново
+        print(
+            f"==> result covers since {checkpoint[0].isoformat()}, "
+            f"full run for the last {WINDOW.total_seconds() / 3600:.0f} h"
+        )
+        incremental = False
+    if incremental:
+        window_start, since = checkpoint
+        print(f"==> incremental run since {since.isoformat()}")
 
     os.makedirs("results", exist_ok=True)
-    with open("results/logs.json", "w", encoding="utf-8") as f:
-        json.dump(aggregated_logs, f, ensure_ascii=False, indent=2)
+    timings = {}
+    stats = {}
+
+    if args.format == "ndjson":
+        # Записи идут в порядке event_type, поэтому и запись, и слияние
+        # с прошлым результатом выполняются потоково
+        if args.mode == "msearch":
+            records = collect_logs_msearch(
+                es, INDEX, since, now, ignore_list,
+                batch_size=args.msearch_batch_size,
+                parallelism=args.parallelism,
+                timings=timings,
+                include_since=not incremental,
+                stats=stats,
+            )
+            records.sort(key=lambda x: x["event_type"])
+        else:
+            records = iter_event_records(
+                es, INDEX, since, now, ignore_list, include_since=not incremental
+            )
+
+        if incremental:
+            records = merge_sorted_records(read_ndjson(results_path), records)
+
+        # Пишем во временный файл с тем же расширением: прошлый результат читается при слиянии
+        tmp_path = os.path.join("results", ".tmp-" + os.path.basename(results_path))
+        started = time.perf_counter()
+        count = write_ndjson(records, tmp_path)
+        os.replace(tmp_path, results_path)
+        save_checkpoint(results_path, window_start, now)
+        # В режиме composite выгрузка из Elasticsearch идет тем же потоком, что и запись
+        phase = "write" if args.mode == "msearch" else "aggregate + write"
+        timings[phase] = time.perf_counter() - started
+    else:
+        started = time.perf_counter()
+        if args.mode == "msearch":
+            aggregated_logs = collect_logs_msearch(
+                es, INDEX, since, now, ignore_list,
+                batch_size=args.msearch_batch_size,
+                parallelism=args.parallelism,
+                timings=timings,
+                include_since=not incremental,
+                stats=stats,
+            )
+        else:
+            aggregated_logs = collect_logs_composite(
+                es, INDEX, since, now, ignore_list, include_since=not incremental
+            )
+            timings["aggregate"] = time.perf_counter() - started
+
+        if incremental:
+            started = time.perf_counter()
+            with open(results_path, "r", encoding="utf-8") as f:
+                aggregated_logs = merge_logs(json.load(f), aggregated_logs)
+            timings["merge"] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        with open(results_path, "w", encoding="utf-8") as f:
+            json.dump(aggregated_logs, f, ensure_ascii=False, indent=2)
+        save_checkpoint(results_path, window_start, now)
+        count = len(aggregated_logs)
+        timings["write"] = time.perf_counter() - started
 
-    print("\n==> result is saved to results/logs.json")
+    for phase, seconds in timings.items():
+        print(f"==> {phase}: {seconds:.2f} s")
+    if stats.get("retried"):
+        print(f"==> _msearch requests retried after errors: {stats['retried']}")
+    print(f"\n==> {count} records are saved to {results_path}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,139 @@
+#!/usr/bin/env python
+
+import re
+import time
+import random
+import argparse
+import statistics
+
+from langchain_community.vectorstores import FAISS
+from langchain_openai import OpenAIEmbeddings
+
+from functions.embedding_backends import LocalEmbeddings
+from functions.embedding_cache import EMBEDDING_MODEL
+from functions.rag_index import CHUNK_OVERLAP, CHUNK_SIZE, DOCS_PATH, iter_file_splits, list_doc_files
+
+
+# Бэкенды без кэша, чтобы измерять настоящую задержку: имя -> конструктор Embeddings
+BACKENDS = {
+    "openai": lambda: OpenAIEmbeddings(model=EMBEDDING_MODEL),
+    "local": lambda: LocalEmbeddings(),
+}
+
+# Запрос строится из строки чанка, в которой не меньше стольких слов
+MIN_QUERY_WORDS = 4
+
+
+def load_chunks(docs_path: str, chunk_size: int, chunk_overlap: int) -> list:
+    chunks = []
+    for _, splits in iter_file_splits(docs_path, list_doc_files(docs_path), chunk_size, chunk_overlap):
+        chunks.extend(splits)
+    return chunks
+
+
+def make_queries(chunks: list, n_queries: int, seed: int = 42) -> list:
+    """
+    Запросы с известным ответом: самая длинная строка случайного чанка без разметки Markdown.
+
+    Возвращает [(запрос, номер чанка)].
+    """
+    rng = random.Random(seed)
+    queries = []
+    for i in rng.sample(range(len(chunks)), len(chunks)):
+        lines = [re.sub(r"[#>*`|_-]+", " ", line).strip() for line in chunks[i].page_content.splitlines()]
+        lines = [line for line in lines if len(line.split()) >= MIN_QUERY_WORDS]
+        if lines:
+            queries.append((max(lines, key=len), i))
+        if len(queries) >= n_queries:
+            break
+    return queries
+
+
+def percentile(values: list, q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def run(name: str, embeddings, chunks: list, queries: list, k: int) -> dict:
+    texts = [chunk.page_content for chunk in chunks]
+
+    started = time.perf_counter()
+    vectors = embeddings.embed_documents(texts)
+    index_time = time.perf_counter() - started
+    vectorstore = FAISS.from_embeddings(
+        list(zip(texts, vectors)), embeddings, metadatas=[{"chunk": i} for i in range(len(texts))]
+    )
+
+    embed_times = []
+    search_times = []
+    hits = 0
+    results = []
+    for query, expected in queries:
+        started = time.perf_counter()
+        vector = embeddings.embed_query(query)
+        embedded = time.perf_counter()
+        docs = vectorstore.similarity_search_by_vector(vector, k=k)
+        finished = time.perf_counter()
+
+        embed_times.append(embedded - started)
+        search_times.append(finished - embedded)
+        found = [doc.metadata["chunk"] for doc in docs]
+        hits += expected in found
+        results.append(found)
+
+    return {
+        "name": name,
+        "dim": len(vectors[0]),
+        "index_time": index_time,
+        "chunks_per_s": len(texts) / index_time if index_time else float("inf"),
+        "embed_p50_ms": statistics.median(embed_times) * 1000,
+        "embed_p95_ms": percentile(embed_times, 0.95) * 1000,
+        "search_p50_ms": statistics.median(search_times) * 1000,
+        "recall": hits / len(queries),
+        "results": results,
+    }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Compare recall and latency of embedding backends on ./docs")
+    parser.add_argument("--backends", nargs="+", choices=list(BACKENDS), default=list(BACKENDS))
+    parser.add_argument("--docs", default=DOCS_PATH)
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--chunk-overlap", type=int, default=CHUNK_OVERLAP)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("-k", type=int, default=2)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    chunks = load_chunks(args.docs, args.chunk_size, args.chunk_overlap)
+    queries = make_queries(chunks, args.queries)
+    print(f"==> chunks: {len(chunks)}, queries: {len(queries)}, k: {args.k}\n")
+
+    reports = [run(name, BACKENDS[name](), chunks, queries, args.k) for name in args.backends]
+
+    print(
+        f"{'backend':<10}{'dim':>6}{'index, s':>10}{'chunks/s':>10}"
+        f"{'query p50, ms':>15}{'query p95, ms':>15}{'search, ms':>12}{f'recall@{args.k}':>10}"
+    )
+    for report in reports:
+        print(
+            f"{report['name']:<10}{report['dim']:>6}{report['index_time']:>10.2f}{report['chunks_per_s']:>10.0f}"
+            f"{report['embed_p50_ms']:>15.1f}{report['embed_p95_ms']:>15.1f}"
+            f"{report['search_p50_ms']:>12.2f}{report['recall']:>10.2f}"
+        )
+
+    # Совпадение top-k с первым бэкендом (обычно удаленным) по тем же запросам
+    reference = reports[0]
+    for report in reports[1:]:
+        overlap = [
+            len(set(a) & set(b)) / args.k
+            for a, b in zip(reference["results"], report["results"])
+        ]
+        print(f"\n==> top-{args.k} overlap {report['name']} vs {reference['name']}: {statistics.mean(overlap):.2f}")
+
+
+if __name__ == "__main__":
+    main()
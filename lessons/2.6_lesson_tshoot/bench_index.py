@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+
+import time
+import argparse
+import statistics
+
+import faiss
+import numpy as np
+
+from functions.vector_index import INDEX_TYPES, TRAIN_SIZE, configure_search, create_index, index_memory_bytes
+
+
+# Значения nprobe / efSearch, по которым строится кривая recall-задержка
+NPROBE_SWEEP = [1, 4, 16, 64]
+EF_SEARCH_SWEEP = [16, 32, 64, 128]
+
+
+def make_vectors(n: int, dim: int, clusters: int, seed: int) -> np.ndarray:
+    """
+    Нормализованные векторы, сгруппированные вокруг clusters центров —
+    грубое подобие эмбеддингов текстов на несколько тем.
+    """
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim), dtype=np.float32)
+    vectors = centers[rng.integers(clusters, size=n)] + 0.5 * rng.standard_normal((n, dim), dtype=np.float32)
+    faiss.normalize_L2(vectors)
+    return vectors
+
+
+def search_latencies(index, queries: np.ndarray, k: int):
+    """Поиск по одному запросу, как в приложении; возвращает (найденные номера, задержки в секундах)."""
+    found = np.empty((len(queries), k), dtype=np.int64)
+    latencies = []
+    for i, query in enumerate(queries):
+        started = time.perf_counter()
+        _, labels = index.search(query[None, :], k)
+        latencies.append(time.perf_counter() - started)
+        found[i] = labels[0]
+    return found, latencies
+
+
+def recall_at_k(found: np.ndarray, truth: np.ndarray) -> float:
+    return float(np.mean([len(set(a) & set(b)) / len(b) for a, b in zip(found, truth)]))
+
+
+def sweep(index_type: str, params: dict) -> list:
+    """Варианты параметров поиска для кривой recall-задержка."""
+    if "nprobe" in params:
+        return [{**params, "nprobe": nprobe} for nprobe in NPROBE_SWEEP if nprobe <= params["nlist"]]
+    if "ef_search" in params:
+        return [{**params, "ef_search": ef} for ef in EF_SEARCH_SWEEP]
+    return [params]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Recall vs latency of FAISS index types on synthetic vectors")
+    parser.add_argument("--types", nargs="+", choices=list(INDEX_TYPES), default=list(INDEX_TYPES))
+    parser.add_argument("-n", type=int, default=200000, help="vectors in the index")
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--clusters", type=int, default=500)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("-k", type=int, default=2)
+    parser.add_argument("--seed", type=int, default=42)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    vectors = make_vectors(args.n + args.queries, args.dim, args.clusters, args.seed)
+    vectors, queries = vectors[:args.n], vectors[args.n:]
+    print(f"==> vectors: {args.n} x {args.dim}, queries: {len(queries)}, k: {args.k}\n")
+
+    # Точный ответ — полный перебор
+    exact = faiss.IndexFlatL2(args.dim)
+    exact.add(vectors)
+    _, truth = exact.search(queries, args.k)
+
+    print(f"{'index':<18}{'search':<14}{'build, s':>10}{'memory, MB':>12}{'p50, ms':>10}{'p95, ms':>10}{f'recall@{args.k}':>10}")
+    for index_type in args.types:
+        started = time.perf_counter()
+        index, params = create_index(index_type, vectors[:TRAIN_SIZE])
+        index.add(vectors)
+        build_time = time.perf_counter() - started
+        memory = index_memory_bytes(index) / 2 ** 20
+
+        for search_params in sweep(index_type, params):
+            configure_search(index, search_params)
+            found, latencies = search_latencies(index, queries, args.k)
+            latencies = sorted(latencies)
+            label = (
+                f"nprobe={search_params['nprobe']}" if "nprobe" in search_params
+                else f"ef={search_params['ef_search']}" if "ef_search" in search_params
+                else "exact" if params["factory"] == "Flat" else "-"
+            )
+            print(
+                f"{params['factory']:<18}{label:<14}{build_time:>10.2f}{memory:>12.1f}"
+                f"{statistics.median(latencies) * 1000:>10.3f}{latencies[int(0.95 * (len(latencies) - 1))] * 1000:>10.3f}"
+                f"{recall_at_k(found, truth):>10.3f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
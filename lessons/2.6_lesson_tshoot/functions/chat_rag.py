@@ -12,11 +12,13 @@ warnings.filterwarnings("ignore", category=LangChainDeprecationWarning)
 from langchain.chat_models import init_chat_model
 from langchain_core.messages import HumanMessage, AIMessage
 
-from langchain_community.vectorstores import FAISS
-from langchain_community.document_loaders import DirectoryLoader, TextLoader
-from langchain_openai import OpenAIEmbeddings
 from langchain.chains import ConversationalRetrievalChain
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from functions.embedding_backends import EMBEDDING_BACKENDS, get_embeddings
+from functions.embedding_cache import format_cache_stats
+from functions.rag_index import DOCS_PATH, current_index_type, format_index_stats, reindex, shared_index
+from functions.streaming import StreamlitTokenHandler
+from functions.vector_index import INDEX_TYPE_HELP, INDEX_TYPES
 
 
 # ---------------------- ВСПОМОГАТЕЛЬНЫЕ ФУНКЦИИ ----------------------
@@ -29,6 +31,29 @@ def log_interaction(question: str, answer: str):
         f.write(f"Ассистент: {answer}\n")
 
 
+def get_qa_chain(llm, model_name: str, vectorstore):
+    """
+    RAG-цепочка из st.session_state.
+
+    Создается заново только при смене модели или после переиндексации
+    (shared_index() вернул другой объект индекса). Переформулировка вопроса
+    идет через отдельную модель без стриминга, чтобы на экран попадал только ответ.
+    """
+    if (
+        st.session_state.get("qa_chain_model") != model_name
+        or st.session_state.get("qa_chain_index") is not vectorstore
+    ):
+        st.session_state.qa_chain = ConversationalRetrievalChain.from_llm(
+            llm=llm,
+            retriever=vectorstore.as_retriever(search_kwargs={"k": 2}),
+            condense_question_llm=init_chat_model(model_name, model_provider="openai", temperature=0.3),
+            return_source_documents=True
+        )
+        st.session_state.qa_chain_model = model_name
+        st.session_state.qa_chain_index = vectorstore
+    return st.session_state.qa_chain
+
+
 # ---------------------------- MAIN ----------------------------
 
 def chat_rag_main():
@@ -40,39 +65,52 @@ def chat_rag_main():
         ["gpt-4o-mini", "gpt-3.5-turbo", "gpt-4o"]
     )
 
-    # Инициализация модели
+    # Модель эмбеддингов для индекса и поиска; у каждой модели свой индекс
+    embedding_backend = st.sidebar.selectbox(
+        "Эмбеддинги:",
+        list(EMBEDDING_BACKENDS),
+        key="embedding_backend"
+    )
+    try:
+        embeddings = get_embeddings(embedding_backend)
+    except RuntimeError as e:
+        st.sidebar.error(str(e))
+        st.stop()
+
+    # Инициализация модели; streaming=True — токены ответа выводятся по мере генерации
     llm = init_chat_model(
         model_name,
         model_provider="openai",
         temperature=0.3,
+        streaming=True,
     )
 
     # История сообщений
     if "messages" not in st.session_state:
         st.session_state.messages = []
 
+    # История в формате (вопрос, ответ) для цепочки, пополняется после каждого ответа
+    if "chat_history" not in st.session_state:
+        st.session_state.chat_history = []
+
     # ---------------------- ЗАГРУЗКА ДОКУМЕНТОВ ----------------------
 
     with st.expander("Загрузка документов для RAG"):
+        # Flat — точный поиск; SQ8, IVF, IVF-PQ, HNSW — быстрее и/или компактнее для большого корпуса
+        index_types = list(INDEX_TYPES)
+        index_type = st.selectbox(
+            "Тип индекса:",
+            index_types,
+            index=index_types.index(current_index_type(embeddings, DOCS_PATH)),
+            help=INDEX_TYPE_HELP,
+        )
         if st.button("Индексировать ./docs"):
             docs_path = "./docs"
             if os.path.exists(docs_path) and os.listdir(docs_path):
                 with st.spinner("Индексируем документы..."):
-                    loader = DirectoryLoader(
-                        docs_path,
-                        loader_cls=TextLoader,
-                        show_progress=True
-                    )
-                    documents = loader.load()
-                    splitter = RecursiveCharacterTextSplitter(
-                        chunk_size=1000,
-                        chunk_overlap=200
-                    )
-                    splits = splitter.split_documents(documents)
-                    embeddings = OpenAIEmbeddings()
-                    vectorstore = FAISS.from_documents(splits, embeddings)
-                    st.session_state.retriever = vectorstore.as_retriever(search_kwargs={"k": 2})
-                    st.success("✅ Документы загружены.")
+                    _, stats = reindex(embeddings, docs_path, index_type=index_type)
+                    st.success(f"✅ Документы загружены. {format_index_stats(stats)}")
+                    st.caption(format_cache_stats(embeddings.stats()))
             else:
                 st.warning("./docs пуста. Поместите туда .txt или .md файлы.")
 
@@ -92,32 +130,25 @@ def chat_rag_main():
         st.session_state.messages.append(user_msg)
 
         try:
-            if "retriever" in st.session_state:
-                # Преобразуем сообщения в формат (вопрос, ответ)
-                chat_history = []
-                last_user_msg = None
-                for m in st.session_state.messages:
-                    if isinstance(m, HumanMessage):
-                        last_user_msg = m.content
-                    elif isinstance(m, AIMessage) and last_user_msg:
-                        chat_history.append((last_user_msg, m.content))
-                        last_user_msg = None
-
-                # Инициализация RAG-цепочки
-                qa_chain = ConversationalRetrievalChain.from_llm(
-                    llm=llm,
-                    retriever=st.session_state.retriever,
-                    return_source_documents=True
-                )
-
-                result = qa_chain.invoke({
-                    "question": prompt,
-                    "chat_history": chat_history
-                })
-
-                answer = result.get("answer", "(нет ответа)")
-                st.chat_message("assistant").write(answer)
+            # Индекс общий для всех сессий, поэтому доступен сразу после индексации в любой из них
+            vectorstore = shared_index(embeddings)
+            if vectorstore is not None:
+                qa_chain = get_qa_chain(llm, model_name, vectorstore)
+
+                with st.chat_message("assistant"):
+                    placeholder = st.empty()
+                    result = qa_chain.invoke(
+                        {
+                            "question": prompt,
+                            "chat_history": st.session_state.chat_history
+                        },
+                        config={"callbacks": [StreamlitTokenHandler(placeholder)]},
+                    )
+                    answer = result.get("answer", "(нет ответа)")
+                    placeholder.write(answer)
+
                 st.session_state.messages.append(AIMessage(content=answer))
+                st.session_state.chat_history.append((prompt, answer))
 
                 # Логируем только вопрос и ответ
                 log_interaction(prompt, answer)
@@ -15,10 +15,11 @@ from langchain.chat_models import init_chat_model
 from langchain_core.messages import HumanMessage, SystemMessage
 from langchain_core.tools import ToolException, tool
 
-from langchain_community.document_loaders import DirectoryLoader, TextLoader
-from langchain_community.vectorstores import FAISS
-from langchain_openai import OpenAIEmbeddings
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+from functions.embedding_backends import DEFAULT_EMBEDDING_BACKEND, EMBEDDING_BACKENDS, get_embeddings
+from functions.embedding_cache import format_cache_stats
+from functions.rag_index import DOCS_PATH, current_index_type, format_index_stats, reindex, shared_retriever
+from functions.streaming import FinalAnswerStreamHandler
+from functions.vector_index import INDEX_TYPE_HELP, INDEX_TYPES
 
 from tools.ping import ping
 from tools.cmdb import cmdb
@@ -40,6 +41,7 @@ def lookup_docs(query: str) -> str:
     Аргумент:
     - query: IP, hostname или ключевое слово. Например, "BI" или "asw1"
     """
+    retriever = get_retriever()
     if retriever is None:
         raise ToolException("База знаний не загружена.")
     docs = retriever.invoke(query)
@@ -117,7 +119,15 @@ def change_vlan_tool(ip: str, port: str, vlan: int) -> str:
 
 # ---------------------------- SETUP ----------------------------
 
-retriever = None
+# Параметры разбиения документов; сам индекс общий для всех сессий
+CHUNK_SIZE = 500 # TUNING
+CHUNK_OVERLAP = 100 # TUNING
+
+
+def get_retriever():
+    """Retriever поверх общего индекса ./docs или None, если документы не проиндексированы."""
+    embeddings = get_embeddings(st.session_state.get("embedding_backend", DEFAULT_EMBEDDING_BACKEND))
+    return shared_retriever(embeddings, DOCS_PATH, CHUNK_SIZE, CHUNK_OVERLAP, k=2, hybrid=True) # TUNING
 
 
 def build_prompt_from_history(messages, system_prompt: str) -> str:
@@ -137,8 +147,6 @@ def build_prompt_from_history(messages, system_prompt: str) -> str:
 # ---------------------------- MAIN ----------------------------
 
 def chat_rag_multitools_memory_main():
-    global retriever
-
     st.title("AI Assistant — Chat & RAG & Multitools & Memory")
 
     model_name = st.sidebar.selectbox(
@@ -146,7 +154,19 @@ def chat_rag_multitools_memory_main():
         ["gpt-4o-mini", "gpt-3.5-turbo", "gpt-4o"]
     )
 
-    llm = init_chat_model(model_name, model_provider="openai", temperature=0.3)
+    # Модель эмбеддингов для индекса и поиска; у каждой модели свой индекс
+    embedding_backend = st.sidebar.selectbox(
+        "Эмбеддинги:",
+        list(EMBEDDING_BACKENDS),
+        key="embedding_backend"
+    )
+    try:
+        embeddings = get_embeddings(embedding_backend)
+    except RuntimeError as e:
+        st.sidebar.error(str(e))
+        st.stop()
+
+    llm = init_chat_model(model_name, model_provider="openai", temperature=0.3, streaming=True)
 
     system_prompt = (
         "Ты — ассистент в корпоративной IT-инфраструктуре.\n"
@@ -165,26 +185,23 @@ def chat_rag_multitools_memory_main():
         st.session_state.messages = []
 
     with st.expander("Загрузка документов для RAG"):
+        # Flat — точный поиск; SQ8, IVF, IVF-PQ, HNSW — быстрее и/или компактнее для большого корпуса
+        index_types = list(INDEX_TYPES)
+        index_type = st.selectbox(
+            "Тип индекса:",
+            index_types,
+            index=index_types.index(current_index_type(embeddings, DOCS_PATH, CHUNK_SIZE, CHUNK_OVERLAP)),
+            help=INDEX_TYPE_HELP,
+        )
         if st.button("Индексировать ./docs"):
             docs_path = "./docs"
             if os.path.exists(docs_path) and os.listdir(docs_path):
                 with st.spinner("Индексируем документы..."):
-                    loader = DirectoryLoader(
-                        docs_path,
-                        loader_cls=TextLoader,
-                        show_progress=True
-                    )
-                    documents = loader.load()
-                    splitter = RecursiveCharacterTextSplitter(
-                        chunk_size=500, # TUNING
-                        chunk_overlap=100 # TUNING
+                    _, stats = reindex(
+                        embeddings, docs_path, CHUNK_SIZE, CHUNK_OVERLAP, index_type=index_type
                     )
-                    splits = splitter.split_documents(documents)
-                    embeddings = OpenAIEmbeddings()
-                    vectorstore = FAISS.from_documents(splits, embeddings)
-                    retriever = vectorstore.as_retriever(search_kwargs={"k": 2}) # TUNING
-                    st.session_state.retriever = retriever
-                    st.success("✅ Загружено и проиндексировано")
+                    st.success(f"✅ Загружено и проиндексировано: {format_index_stats(stats)}")
+                    st.caption(format_cache_stats(embeddings.stats()))
             else:
                 st.warning("Директория ./docs пуста")
 
@@ -224,9 +241,15 @@ def chat_rag_multitools_memory_main():
                 system_prompt=system_prompt
             )
             print(f"==> full prompt:\n{full_prompt}")
-            result = agent.invoke({"input": full_prompt})
-            answer = result.get("output", "(нет ответа)")
-            st.chat_message("assistant").write(answer)
+            # Промежуточные шаги агента не показываются, стримится только "Final Answer"
+            with st.chat_message("assistant"):
+                placeholder = st.empty()
+                result = agent.invoke(
+                    {"input": full_prompt},
+                    config={"callbacks": [FinalAnswerStreamHandler(placeholder)]},
+                )
+                answer = result.get("output", "(нет ответа)")
+                placeholder.write(answer)
             st.session_state.messages.append(
                 SystemMessage(name="assistant", content=answer)
             )
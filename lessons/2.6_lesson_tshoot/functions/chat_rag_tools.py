@@ -14,10 +14,11 @@ from langchain_core.messages import HumanMessage, SystemMessage
 from langchain_core.tools import tool
 from langchain.agents import initialize_agent, AgentType
 
-from langchain_community.vectorstores import FAISS
-from langchain_community.document_loaders import DirectoryLoader, TextLoader
-from langchain_openai import OpenAIEmbeddings
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+from functions.embedding_backends import DEFAULT_EMBEDDING_BACKEND, EMBEDDING_BACKENDS, get_embeddings
+from functions.embedding_cache import format_cache_stats
+from functions.rag_index import DOCS_PATH, current_index_type, format_index_stats, reindex, shared_retriever
+from functions.streaming import StreamlitTokenHandler
+from functions.vector_index import INDEX_TYPE_HELP, INDEX_TYPES
 
 from tools.ping import ping
 
@@ -44,6 +45,7 @@ def lookup_docs(query: str) -> str:
     """
     Ищет информацию по внутренней документации.
     """
+    retriever = get_retriever()
     if retriever is None:
         return "База знаний не загружена."
 
@@ -55,13 +57,14 @@ def lookup_docs(query: str) -> str:
 
 # ---------------------------- SETUP ----------------------------
 
-retriever = None
+def get_retriever():
+    """Retriever поверх общего индекса ./docs или None, если документы не проиндексированы."""
+    embeddings = get_embeddings(st.session_state.get("embedding_backend", DEFAULT_EMBEDDING_BACKEND))
+    return shared_retriever(embeddings, DOCS_PATH, hybrid=True)
 
 # ---------------------------- MAIN ----------------------------
 
 def chat_rag_tools_main():
-    global retriever
-
     st.title("AI Assistant — Chat & RAG & Tools")
 
     # Выбор модели
@@ -70,7 +73,19 @@ def chat_rag_tools_main():
         ["gpt-4o-mini", "gpt-3.5-turbo", "gpt-4o"]
     )
 
-    llm = init_chat_model(model_name, model_provider="openai", temperature=0.3)
+    # Модель эмбеддингов для индекса и поиска; у каждой модели свой индекс
+    embedding_backend = st.sidebar.selectbox(
+        "Эмбеддинги:",
+        list(EMBEDDING_BACKENDS),
+        key="embedding_backend"
+    )
+    try:
+        embeddings = get_embeddings(embedding_backend)
+    except RuntimeError as e:
+        st.sidebar.error(str(e))
+        st.stop()
+
+    llm = init_chat_model(model_name, model_provider="openai", temperature=0.3, streaming=True)
 
     # История сообщений
     if "messages" not in st.session_state:
@@ -78,26 +93,21 @@ def chat_rag_tools_main():
 
     # Загрузка документов в retriever
     with st.expander("Загрузка документов для RAG"):
+        # Flat — точный поиск; SQ8, IVF, IVF-PQ, HNSW — быстрее и/или компактнее для большого корпуса
+        index_types = list(INDEX_TYPES)
+        index_type = st.selectbox(
+            "Тип индекса:",
+            index_types,
+            index=index_types.index(current_index_type(embeddings, DOCS_PATH)),
+            help=INDEX_TYPE_HELP,
+        )
         if st.button("Индексировать ./docs"):
             docs_path = "./docs"
             if os.path.exists(docs_path) and os.listdir(docs_path):
                 with st.spinner("Индексируем документы..."):
-                    loader = DirectoryLoader(
-                        docs_path,
-                        loader_cls=TextLoader,
-                        show_progress=True
-                    )
-                    documents = loader.load()
-                    splitter = RecursiveCharacterTextSplitter(
-                        chunk_size=1000,
-                        chunk_overlap=200
-                    )
-                    splits = splitter.split_documents(documents)
-                    embeddings = OpenAIEmbeddings()
-                    vectorstore = FAISS.from_documents(splits, embeddings)
-                    st.session_state.retriever = vectorstore.as_retriever(search_kwargs={"k": 2})
-                    retriever = st.session_state.retriever
-                    st.success("✅ Загружено и проиндексировано")
+                    _, stats = reindex(embeddings, docs_path, index_type=index_type)
+                    st.success(f"✅ Загружено и проиндексировано: {format_index_stats(stats)}")
+                    st.caption(format_cache_stats(embeddings.stats()))
             else:
                 st.warning("Директория ./docs пуста")
 
@@ -115,7 +125,7 @@ def chat_rag_tools_main():
         st.session_state.messages.append(user_msg)
 
         # Если retriever есть — инициализируем агента
-        if "retriever" in st.session_state:
+        if get_retriever() is not None:
             tools = [lookup_docs, ping_tool]
 
             agent = initialize_agent(
@@ -126,9 +136,15 @@ def chat_rag_tools_main():
             )
 
             try:
-                result = agent.invoke({"input": prompt})
-                answer = result.get("output", "(нет ответа)")
-                st.chat_message("assistant").write(answer)
+                # Шаги с вызовом функций не дают текста, поэтому стримится только ответ
+                with st.chat_message("assistant"):
+                    placeholder = st.empty()
+                    result = agent.invoke(
+                        {"input": prompt},
+                        config={"callbacks": [StreamlitTokenHandler(placeholder)]},
+                    )
+                    answer = result.get("output", "(нет ответа)")
+                    placeholder.write(answer)
                 st.session_state.messages.append(
                     SystemMessage(name="assistant", content=answer)
                 )
@@ -0,0 +1,92 @@
+import json
+import mmap
+import os
+from collections.abc import Mapping
+
+import numpy as np
+from langchain_community.docstore.base import Docstore
+from langchain_core.documents import Document
+
+
+# Тексты чанков: JSON-записи подряд в порядке позиций в FAISS-индексе
+# и смещения записей (int64, n + 1) для доступа по позиции без разбора всего файла
+CHUNKS_SUFFIX = ".bin"
+OFFSETS_SUFFIX = ".offsets.npy"
+
+
+def write_chunks(prefix: str, documents) -> int:
+    """
+    Записывает чанки в prefix.bin и смещения в prefix.offsets.npy.
+
+    documents — Document в порядке позиций индекса. Возвращает число записей.
+    """
+    offsets = [0]
+    with open(prefix + CHUNKS_SUFFIX, "wb") as f:
+        for doc in documents:
+            record = {"id": doc.id, "page_content": doc.page_content, "metadata": doc.metadata}
+            f.write(json.dumps(record, ensure_ascii=False).encode("utf-8"))
+            offsets.append(f.tell())
+    with open(prefix + OFFSETS_SUFFIX, "wb") as f:
+        np.save(f, np.asarray(offsets, dtype=np.int64))
+    return len(offsets) - 1
+
+
+def _record_to_document(raw: bytes) -> Document:
+    record = json.loads(raw)
+    return Document(id=record["id"], page_content=record["page_content"], metadata=record["metadata"])
+
+
+class MmapDocstore(Docstore):
+    """
+    Docstore только для чтения поверх файлов write_chunks().
+
+    Файлы отображаются в память (mmap): открытие не зависит от размера
+    корпуса, страницы читаются по требованию и общие для всех процессов через
+    кэш ОС. Ключ — позиция чанка в FAISS-индексе (см. PositionIds).
+    """
+
+    def __init__(self, prefix: str):
+        self.offsets = np.load(prefix + OFFSETS_SUFFIX, mmap_mode="r")
+        with open(prefix + CHUNKS_SUFFIX, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            # mmap не отображает пустой файл
+            self._blob = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        if int(self.offsets[-1]) != size:
+            raise RuntimeError(f"Файл {prefix + CHUNKS_SUFFIX} не совпадает со смещениями")
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def document(self, position: int) -> Document:
+        start, end = int(self.offsets[position]), int(self.offsets[position + 1])
+        return _record_to_document(self._blob[start:end])
+
+    def search(self, search):
+        position = int(search)
+        if not 0 <= position < len(self):
+            return f"ID {search} not found."
+        return self.document(position)
+
+
+class PositionIds(Mapping):
+    """index_to_docstore_id для MmapDocstore: позиция в индексе — сама себе ключ."""
+
+    def __init__(self, size: int):
+        self.size = size
+
+    def __getitem__(self, position):
+        if not 0 <= position < self.size:
+            raise KeyError(position)
+        return int(position)
+
+    def __iter__(self):
+        return iter(range(self.size))
+
+    def __len__(self) -> int:
+        return self.size
+
+
+def read_chunks(prefix: str) -> list:
+    """Все чанки из файлов write_chunks() в порядке позиций."""
+    store = MmapDocstore(prefix)
+    return [store.document(i) for i in range(len(store))]
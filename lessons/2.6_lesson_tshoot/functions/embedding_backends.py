@@ -0,0 +1,64 @@
+from functools import lru_cache
+
+from langchain_core.embeddings import Embeddings
+
+from functions.embedding_cache import CachedEmbeddings, cached_openai_embeddings
+
+try:
+    from sentence_transformers import SentenceTransformer
+except ImportError:
+    SentenceTransformer = None
+
+
+# Локальная модель: многоязычная (документы на русском), 384 измерения, работает на CPU
+LOCAL_EMBEDDING_MODEL = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
+LOCAL_BATCH_SIZE = 64
+
+DEFAULT_EMBEDDING_BACKEND = "OpenAI"
+
+
+class LocalEmbeddings(Embeddings):
+    """
+    Эмбеддинги локальной моделью sentence-transformers, без сетевых запросов.
+
+    Тексты кодируются пакетами по batch_size за один вызов encode(), векторы
+    нормализуются, поэтому расстояние L2 в FAISS эквивалентно косинусному.
+    """
+
+    def __init__(self, model: str = LOCAL_EMBEDDING_MODEL, batch_size: int = LOCAL_BATCH_SIZE, device: str = "cpu"):
+        if SentenceTransformer is None:
+            raise RuntimeError("Для локальных эмбеддингов установите пакет sentence-transformers")
+        self.model = model
+        self.batch_size = batch_size
+        self._model = SentenceTransformer(model, device=device)
+
+    def embed_documents(self, texts: list) -> list:
+        vectors = self._model.encode(
+            texts,
+            batch_size=self.batch_size,
+            normalize_embeddings=True,
+            convert_to_numpy=True,
+            show_progress_bar=False,
+        )
+        return vectors.tolist()
+
+    def embed_query(self, text: str) -> list:
+        return self.embed_documents([text])[0]
+
+
+@lru_cache(maxsize=None)
+def cached_local_embeddings(model: str = LOCAL_EMBEDDING_MODEL) -> CachedEmbeddings:
+    """Общая на процесс локальная модель с кэшем: модель загружается в память один раз."""
+    return CachedEmbeddings(LocalEmbeddings(model), model_name=model)
+
+
+# Варианты для выбора в сайдбаре: название -> функция, возвращающая Embeddings
+EMBEDDING_BACKENDS = {
+    "OpenAI": cached_openai_embeddings,
+    "Локальная (CPU)": cached_local_embeddings,
+}
+
+
+def get_embeddings(backend: str = DEFAULT_EMBEDDING_BACKEND) -> CachedEmbeddings:
+    """Embeddings выбранного в сайдбаре варианта из EMBEDDING_BACKENDS."""
+    return EMBEDDING_BACKENDS[backend]()
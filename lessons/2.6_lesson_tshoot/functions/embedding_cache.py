@@ -0,0 +1,250 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import closing, contextmanager
+from functools import lru_cache
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_openai import OpenAIEmbeddings
+
+from functions.embedding_pipeline import RateLimitedEmbeddings
+
+
+# Каталог кэша, максимальное число векторов на модель и модель эмбеддингов по умолчанию
+EMBEDDING_CACHE_DIR = "./cache/embeddings"
+EMBEDDING_CACHE_MAX_ENTRIES = 200000
+EMBEDDING_MODEL = "text-embedding-ada-002"
+
+# Начальная емкость файла векторов (строк), дальше он растет вдвое
+_INITIAL_CAPACITY = 1024
+
+
+def embedding_cache_key(model_name: str, text: str) -> str:
+    """Ключ кэша: модель + sha256 текста."""
+    return hashlib.sha256(f"{model_name}\n{text}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Постоянный кэш эмбеддингов.
+
+    Векторы лежат в файле float32, который открывается через np.memmap, поэтому
+    чтение не загружает файл в память целиком. Положение вектора (slot) и время
+    последнего обращения хранятся в SQLite. Для каждой модели свой файл; при
+    превышении max_entries новые векторы занимают слоты тех, к которым дольше
+    всего не обращались. Счетчики hits/misses накапливаются за время жизни объекта.
+    """
+
+    def __init__(self, path: str = EMBEDDING_CACHE_DIR, max_entries: int = EMBEDDING_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._vectors = {}
+
+        os.makedirs(path, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                " key TEXT PRIMARY KEY,"
+                " model TEXT NOT NULL,"
+                " dim INTEGER NOT NULL,"
+                " slot INTEGER NOT NULL,"
+                " accessed_at REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS embeddings_model_accessed_at"
+                " ON embeddings (model, dim, accessed_at)"
+            )
+
+    @contextmanager
+    def _connect(self):
+        # with sqlite3.Connection только фиксирует или откатывает транзакцию,
+        # соединение закрывается отдельно через closing()
+        with closing(sqlite3.connect(os.path.join(self.path, "index.db"), timeout=10)) as conn, conn:
+            yield conn
+
+    def _vectors_path(self, model_name: str, dim: int) -> str:
+        safe_name = re.sub(r"[^A-Za-z0-9_.-]", "_", model_name)
+        return os.path.join(self.path, f"{safe_name}-{dim}.f32")
+
+    def _open(self, model_name: str, dim: int, rows: int = 0):
+        """memmap файла векторов модели; файл увеличивается, если в нем меньше rows строк."""
+        path = self._vectors_path(model_name, dim)
+        row_bytes = dim * 4
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+        if size < rows * row_bytes:
+            capacity = max(_INITIAL_CAPACITY, size // row_bytes)
+            while capacity < rows:
+                capacity *= 2
+            with open(path, "ab") as f:
+                f.truncate(min(capacity, self.max_entries) * row_bytes)
+            size = os.path.getsize(path)
+
+        vectors = self._vectors.get((model_name, dim))
+        if vectors is None or vectors.shape[0] * row_bytes != size:
+            # Файл мог вырасти в этом или другом процессе — открываем заново
+            vectors = np.memmap(path, dtype=np.float32, mode="r+", shape=(size // row_bytes, dim))
+            self._vectors[(model_name, dim)] = vectors
+        return vectors
+
+    def get_many(self, model_name: str, keys: list) -> dict:
+        """Возвращает {key: вектор} для найденных ключей."""
+        found = {}
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            rows = []
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows.extend(conn.execute(
+                    f"SELECT key, dim, slot FROM embeddings WHERE model = ? AND key IN ({placeholders})",
+                    [model_name, *chunk],
+                ).fetchall())
+            for key, dim, slot in rows:
+                vectors = self._open(model_name, dim)
+                if slot < vectors.shape[0]:
+                    found[key] = vectors[slot].tolist()
+            conn.executemany(
+                "UPDATE embeddings SET accessed_at = ? WHERE key = ?",
+                [(now, key) for key in found],
+            )
+        self.hits += len(found)
+        self.misses += len(set(keys)) - len(found)
+        return found
+
+    def put_many(self, model_name: str, entries: list) -> None:
+        """Сохраняет список (key, вектор) и применяет вытеснение."""
+        if not entries:
+            return
+        entries = entries[-self.max_entries:]
+        dim = len(entries[0][1])
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            # Блокировка записи до чтения занятых слотов: иначе другой процесс
+            # с тем же кэшем может отдать тот же слот другому ключу
+            conn.execute("BEGIN IMMEDIATE")
+            keys = [key for key, _ in entries]
+            # Ключи, которые уже есть, перезаписываются в свои слоты
+            slots = {}
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                slots.update(conn.execute(
+                    f"SELECT key, slot FROM embeddings WHERE model = ? AND dim = ? AND key IN ({placeholders})",
+                    [model_name, dim, *chunk],
+                ).fetchall())
+
+            new_keys = [key for key in dict.fromkeys(keys) if key not in slots]
+            used = conn.execute(
+                "SELECT COUNT(*) FROM embeddings WHERE model = ? AND dim = ?", (model_name, dim)
+            ).fetchone()[0]
+            free = max(0, min(len(new_keys), self.max_entries - used))
+            new_slots = list(range(used, used + free))
+            if len(new_keys) > free:
+                # Ключи этого пакета не вытесняются: их слоты уже заняты ими.
+                # Кандидатов берется с запасом на них и отбрасываются лишние
+                candidates = conn.execute(
+                    "SELECT key, slot FROM embeddings WHERE model = ? AND dim = ?"
+                    " ORDER BY accessed_at LIMIT ?",
+                    (model_name, dim, len(new_keys) - free + len(slots)),
+                ).fetchall()
+                evicted = [(key, slot) for key, slot in candidates if key not in slots][:len(new_keys) - free]
+                conn.executemany("DELETE FROM embeddings WHERE key = ?", [(key,) for key, _ in evicted])
+                new_slots.extend(slot for _, slot in evicted)
+            slots.update(zip(new_keys, new_slots))
+
+            vectors = self._open(model_name, dim, rows=max(slots.values()) + 1)
+            for key, vector in entries:
+                vectors[slots[key]] = vector
+            vectors.flush()
+
+            conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, model, dim, slot, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                [(key, model_name, dim, slots[key], now) for key in dict.fromkeys(keys)],
+            )
+
+    def size(self) -> int:
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def stats(self) -> dict:
+        """Счетчики попаданий и промахов кэша."""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "size": self.size(),
+        }
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Обертка над Embeddings, которая сначала ищет векторы в EmbeddingCache.
+
+    В базовую модель уходят только тексты, которых нет в кэше, причем каждый
+    уникальный текст один раз. Вектор запроса и документа с тем же текстом у
+    OpenAIEmbeddings совпадают, поэтому кэш у них общий.
+    """
+
+    def __init__(self, embeddings: Embeddings, model_name: str = None, cache: EmbeddingCache = None):
+        self.embeddings = embeddings
+        self.model_name = model_name or getattr(embeddings, "model", type(embeddings).__name__)
+        self.cache = cache or EmbeddingCache()
+
+    def embed_documents(self, texts: list) -> list:
+        keys = [embedding_cache_key(self.model_name, text) for text in texts]
+        found = self.cache.get_many(self.model_name, keys)
+
+        missing = {key: text for key, text in zip(keys, texts) if key not in found}
+        if not missing:
+            return [found[key] for key in keys]
+
+        missing_keys = list(missing)
+        if hasattr(self.embeddings, "iter_embed_documents"):
+            # Пакеты сохраняются по мере готовности: после сбоя готовые векторы не считаются заново
+            batches = self.embeddings.iter_embed_documents(list(missing.values()))
+        else:
+            batches = [(range(len(missing)), self.embeddings.embed_documents(list(missing.values())))]
+        for indices, vectors in batches:
+            new_entries = [(missing_keys[i], vector) for i, vector in zip(indices, vectors)]
+            self.cache.put_many(self.model_name, new_entries)
+            found.update(new_entries)
+        return [found[key] for key in keys]
+
+    def embed_query(self, text: str) -> list:
+        key = embedding_cache_key(self.model_name, text)
+        found = self.cache.get_many(self.model_name, [key])
+        if key in found:
+            return found[key]
+        vector = self.embeddings.embed_query(text)
+        self.cache.put_many(self.model_name, [(key, vector)])
+        return vector
+
+    def stats(self) -> dict:
+        return self.cache.stats()
+
+
+@lru_cache(maxsize=None)
+def cached_openai_embeddings(model: str = EMBEDDING_MODEL) -> CachedEmbeddings:
+    """
+    Общий на процесс OpenAIEmbeddings с кэшем: счетчики попаданий копятся для всех сессий.
+
+    Повторы при 429 выполняет RateLimitedEmbeddings, поэтому у клиента OpenAI они отключены.
+    """
+    embeddings = RateLimitedEmbeddings(OpenAIEmbeddings(model=model, max_retries=0))
+    return CachedEmbeddings(embeddings, model_name=model)
+
+
+def format_cache_stats(stats: dict) -> str:
+    """Краткий отчет о кэше эмбеддингов для st.caption."""
+    return (
+        f"Кэш эмбеддингов: попаданий {stats['hits']}, промахов {stats['misses']} "
+        f"({stats['hit_rate']:.0%}), векторов в кэше {stats['size']}"
+    )
@@ -0,0 +1,191 @@
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import openai
+from langchain_core.embeddings import Embeddings
+
+
+# Размер пакета для одного запроса к embeddings: оценка токенов и число текстов
+EMBED_BATCH_TOKEN_BUDGET = 50000
+EMBED_BATCH_MAX_ITEMS = 256
+
+# Одновременные запросы и повторы при 429 / временных ошибках провайдера
+EMBED_MAX_CONCURRENCY = 4
+EMBED_MAX_RETRIES = 8
+EMBED_BACKOFF_BASE = 1.0
+EMBED_BACKOFF_MAX = 60.0
+
+RETRYABLE_ERRORS = (openai.RateLimitError, openai.APIConnectionError, openai.InternalServerError)
+
+
+def estimate_tokens(text: str) -> int:
+    """Грубая оценка числа токенов: ~4 символа на токен."""
+    return len(text) // 4 + 1
+
+
+def split_texts_by_token_budget(
+    texts: list,
+    token_budget: int = EMBED_BATCH_TOKEN_BUDGET,
+    max_items: int = EMBED_BATCH_MAX_ITEMS,
+) -> list:
+    """
+    Делит индексы texts на пакеты, текст которых укладывается в token_budget.
+
+    Текст, который сам по себе больше бюджета, попадает в отдельный пакет.
+    """
+    batches = []
+    batch = []
+    batch_tokens = 0
+    for i, text in enumerate(texts):
+        tokens = estimate_tokens(text)
+        if batch and (batch_tokens + tokens > token_budget or len(batch) >= max_items):
+            batches.append(batch)
+            batch = []
+            batch_tokens = 0
+        batch.append(i)
+        batch_tokens += tokens
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+class _AdaptiveLimit:
+    """
+    Ограничение числа запросов в полете, которое подстраивается под провайдера.
+
+    После 429 лимит уменьшается вдвое и все потоки ждут до resume_at; после
+    limit успешных запросов подряд лимит растет на 1, но не выше max_limit.
+    """
+
+    def __init__(self, max_limit: int):
+        self.max_limit = max_limit
+        self.limit = max_limit
+        self.in_flight = 0
+        self.resume_at = 0.0
+        self._successes = 0
+        self._cond = threading.Condition()
+
+    def acquire(self) -> None:
+        with self._cond:
+            while self.in_flight >= self.limit:
+                self._cond.wait()
+            self.in_flight += 1
+        delay = self.resume_at - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+    def release(self) -> None:
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify_all()
+
+    def on_success(self) -> None:
+        with self._cond:
+            self._successes += 1
+            if self._successes >= self.limit and self.limit < self.max_limit:
+                self.limit += 1
+                self._successes = 0
+                self._cond.notify_all()
+
+    def on_rate_limit(self, delay: float) -> None:
+        with self._cond:
+            self.limit = max(1, self.limit // 2)
+            self._successes = 0
+            self.resume_at = max(self.resume_at, time.monotonic() + delay)
+
+
+def _retry_after(error: Exception):
+    """Значение заголовка Retry-After в секундах, если провайдер его прислал."""
+    response = getattr(error, "response", None)
+    value = response.headers.get("retry-after") if response is not None else None
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+class RateLimitedEmbeddings(Embeddings):
+    """
+    Обертка над Embeddings для больших корпусов.
+
+    Тексты делятся на пакеты по token_budget, до max_concurrency пакетов
+    отправляются одновременно. На 429 и временные ошибки — повтор с
+    экспоненциальной задержкой (или Retry-After) и снижением параллельности.
+
+    iter_embed_documents() выдает пакеты по мере готовности, поэтому
+    CachedEmbeddings сохраняет результат каждого пакета на диск сразу:
+    после сбоя повторная индексация продолжается с места остановки.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        token_budget: int = EMBED_BATCH_TOKEN_BUDGET,
+        max_items: int = EMBED_BATCH_MAX_ITEMS,
+        max_concurrency: int = EMBED_MAX_CONCURRENCY,
+        max_retries: int = EMBED_MAX_RETRIES,
+    ):
+        self.embeddings = embeddings
+        self.model = getattr(embeddings, "model", type(embeddings).__name__)
+        self.token_budget = token_budget
+        self.max_items = max_items
+        self.max_retries = max_retries
+        self.requests = 0
+        self.retries = 0
+        self._limit = _AdaptiveLimit(max_concurrency)
+
+    def _call(self, fn, *args):
+        """Вызывает fn с повторами на RETRYABLE_ERRORS."""
+        for attempt in range(self.max_retries + 1):
+            self._limit.acquire()
+            try:
+                self.requests += 1
+                result = fn(*args)
+            except RETRYABLE_ERRORS as error:
+                if attempt == self.max_retries:
+                    raise
+                self.retries += 1
+                delay = _retry_after(error)
+                if delay is None:
+                    delay = min(EMBED_BACKOFF_MAX, EMBED_BACKOFF_BASE * 2 ** attempt)
+                    delay *= random.uniform(0.5, 1.5)
+                if isinstance(error, openai.RateLimitError):
+                    self._limit.on_rate_limit(delay)
+                else:
+                    time.sleep(delay)
+                continue
+            finally:
+                self._limit.release()
+            self._limit.on_success()
+            return result
+
+    def iter_embed_documents(self, texts: list):
+        """Выдает (индексы в texts, векторы) по мере готовности пакетов."""
+        batches = split_texts_by_token_budget(texts, self.token_budget, self.max_items)
+        if len(batches) == 1:
+            yield batches[0], self._call(self.embeddings.embed_documents, texts)
+            return
+        with ThreadPoolExecutor(max_workers=self._limit.max_limit) as executor:
+            futures = {
+                executor.submit(self._call, self.embeddings.embed_documents, [texts[i] for i in batch]): batch
+                for batch in batches
+            }
+            try:
+                for future in as_completed(futures):
+                    yield futures[future], future.result()
+            finally:
+                # При ошибке не ждем оставшиеся пакеты: их результат все равно не будет сохранен
+                for future in futures:
+                    future.cancel()
+
+    def embed_documents(self, texts: list) -> list:
+        vectors = [None] * len(texts)
+        for indices, batch_vectors in self.iter_embed_documents(texts):
+            for i, vector in zip(indices, batch_vectors):
+                vectors[i] = vector
+        return vectors
+
+    def embed_query(self, text: str) -> list:
+        return self._call(self.embeddings.embed_query, text)
@@ -0,0 +1,268 @@
+import math
+import re
+import threading
+import weakref
+from collections import Counter
+from typing import Any
+
+import numpy as np
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+
+# Токен: слово или идентификатор с точками, дефисами, слешами и двоеточиями:
+# asw1, 192.168.1.10, Gi0/1, aabb.cc00.0001
+TOKEN_RE = re.compile(r"[\w]+(?:[./:-][\w]+)*")
+
+# Параметры BM25 и сглаживание reciprocal rank fusion
+BM25_K1 = 1.5
+BM25_B = 0.75
+RRF_K = 60
+
+# Файлы BM25Index.save(): prefix.<часть>.npy
+BM25_ARRAYS = ("tokens", "token_offsets", "postings_offsets", "postings_docs", "postings_tf", "lengths")
+
+# Запрос из стольких токенов и меньше, в котором есть идентификатор, ищется только по BM25
+EXACT_QUERY_MAX_TOKENS = 3
+
+
+def tokenize(text: str) -> list:
+    """
+    Токены для BM25 в нижнем регистре.
+
+    Составной идентификатор дает и сам себя, и свои части: "Gi0/1" -> "gi0/1", "gi0", "1",
+    поэтому находятся и точное совпадение, и упоминание части.
+    """
+    tokens = []
+    for token in TOKEN_RE.findall(text.lower()):
+        tokens.append(token)
+        parts = re.split(r"[./:-]", token)
+        if len(parts) > 1:
+            tokens.extend(part for part in parts if part)
+    return tokens
+
+
+def is_identifier(token: str) -> bool:
+    """Hostname, IP, номер VLAN или порта: токен с цифрой."""
+    return any(char.isdigit() for char in token)
+
+
+class BM25Index:
+    """
+    Инвертированный индекс BM25 по чанкам документов.
+
+    Словарь отсортирован, списки (номер документа, частота) всех токенов
+    лежат подряд в массивах numpy, поиск проходит только по спискам токенов
+    запроса. Индекс строится по текстам (build) и сохраняется в файлы .npy
+    (save); load() отображает их в память, поэтому загрузка не зависит от
+    размера корпуса, а процессы делят страницы через кэш ОС.
+
+    document(i) возвращает Document по номеру — позиции чанка в FAISS-индексе.
+    """
+
+    def __init__(self, vocabulary, postings_offsets, postings_docs, postings_tf, lengths, document):
+        self.vocabulary = vocabulary
+        self.postings_offsets = postings_offsets
+        self.postings_docs = postings_docs
+        self.postings_tf = postings_tf
+        self.lengths = lengths
+        self.document = document
+        self.avgdl = float(lengths.mean()) if len(lengths) else 0.0
+
+    @classmethod
+    def build(cls, texts, document):
+        """Строит индекс по текстам в порядке номеров документов."""
+        postings = {}
+        lengths = []
+        for i, text in enumerate(texts):
+            counts = Counter(tokenize(text))
+            lengths.append(sum(counts.values()))
+            for token, tf in counts.items():
+                postings.setdefault(token, []).append((i, tf))
+
+        # Порядок токенов — по байтам UTF-8, как при бинарном поиске в _MappedVocabulary
+        tokens = sorted(postings, key=lambda token: token.encode("utf-8"))
+        sizes = [len(postings[token]) for token in tokens]
+        pairs = [pair for token in tokens for pair in postings[token]]
+        return cls(
+            {token: i for i, token in enumerate(tokens)},
+            np.concatenate([[0], np.cumsum(sizes, dtype=np.int64)]).astype(np.int64),
+            np.array([doc for doc, _ in pairs], dtype=np.int32),
+            np.array([tf for _, tf in pairs], dtype=np.int32),
+            np.array(lengths, dtype=np.int32),
+            document,
+        )
+
+    def save(self, prefix: str) -> None:
+        """Сохраняет индекс в файлы prefix.<часть>.npy."""
+        tokens = sorted(self.vocabulary, key=self.vocabulary.get)
+        encoded = [token.encode("utf-8") for token in tokens]
+        token_offsets = np.concatenate([[0], np.cumsum([len(token) for token in encoded], dtype=np.int64)])
+        arrays = {
+            "tokens": np.frombuffer(b"".join(encoded), dtype=np.uint8),
+            "token_offsets": token_offsets.astype(np.int64),
+            "postings_offsets": self.postings_offsets,
+            "postings_docs": self.postings_docs,
+            "postings_tf": self.postings_tf,
+            "lengths": self.lengths,
+        }
+        for name, array in arrays.items():
+            np.save(f"{prefix}.{name}.npy", np.asarray(array))
+
+    @classmethod
+    def load(cls, prefix: str, document):
+        """Отображает в память индекс, сохраненный save()."""
+        arrays = {name: _load_array(f"{prefix}.{name}.npy") for name in BM25_ARRAYS}
+        return cls(
+            _MappedVocabulary(arrays["tokens"], arrays["token_offsets"]),
+            arrays["postings_offsets"],
+            arrays["postings_docs"],
+            arrays["postings_tf"],
+            arrays["lengths"],
+            document,
+        )
+
+    def __contains__(self, token: str) -> bool:
+        return self.vocabulary.get(token) is not None
+
+    def search(self, query: str, k: int) -> list:
+        """Возвращает до k пар (документ, score) по убыванию score."""
+        n_docs = len(self.lengths)
+        docs = []
+        scores = []
+        for token in set(tokenize(query)):
+            t = self.vocabulary.get(token)
+            if t is None:
+                continue
+            start, end = int(self.postings_offsets[t]), int(self.postings_offsets[t + 1])
+            token_docs = np.asarray(self.postings_docs[start:end])
+            tf = np.asarray(self.postings_tf[start:end], dtype=np.float64)
+            idf = math.log(1 + (n_docs - (end - start) + 0.5) / (end - start + 0.5))
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths[token_docs] / (self.avgdl or 1.0))
+            docs.append(token_docs)
+            scores.append(idf * tf * (BM25_K1 + 1) / (tf + norm))
+        if not docs:
+            return []
+
+        unique, inverse = np.unique(np.concatenate(docs), return_inverse=True)
+        totals = np.bincount(inverse, weights=np.concatenate(scores))
+        best = np.argsort(-totals, kind="stable")[:k]
+        return [(self.document(int(unique[i])), float(totals[i])) for i in best]
+
+
+class _MappedVocabulary:
+    """Словарь BM25Index из файлов: отсортированные токены и их смещения, поиск делением пополам."""
+
+    def __init__(self, tokens, token_offsets):
+        self.tokens = tokens
+        self.token_offsets = token_offsets
+
+    def _token(self, i: int) -> bytes:
+        return self.tokens[int(self.token_offsets[i]):int(self.token_offsets[i + 1])].tobytes()
+
+    def get(self, token: str):
+        key = token.encode("utf-8")
+        lo, hi = 0, len(self.token_offsets) - 1
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._token(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < len(self.token_offsets) - 1 and self._token(lo) == key:
+            return lo
+        return None
+
+
+def _load_array(path: str) -> np.ndarray:
+    try:
+        return np.load(path, mmap_mode="r")
+    except ValueError:
+        # Пустой массив нельзя отобразить в память
+        return np.load(path)
+
+
+def _doc_key(doc: Document):
+    return doc.id or (doc.metadata.get("source"), doc.page_content)
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Гибридный поиск: BM25 по точным токенам + векторный поиск FAISS.
+
+    Короткий запрос с идентификатором (asw1, 192.168.1.10, vlan 10), все
+    идентификаторы которого есть в индексе, обслуживается только BM25 — без
+    обращения к embeddings. Остальные запросы объединяются reciprocal rank fusion.
+    """
+
+    vectorstore: Any
+    bm25: Any
+    k: int = 2
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> list:
+        tokens = TOKEN_RE.findall(query.lower())
+        identifiers = [token for token in tokens if is_identifier(token)]
+        keyword_hits = self.bm25.search(query, self.k * 2)
+
+        if (
+            identifiers
+            and len(tokens) <= EXACT_QUERY_MAX_TOKENS
+            and all(token in self.bm25 for token in identifiers)
+        ):
+            return [doc for doc, _ in keyword_hits[:self.k]]
+
+        vector_hits = self.vectorstore.similarity_search(query, k=self.k * 2)
+        fused = {}
+        docs = {}
+        for ranking in ([doc for doc, _ in keyword_hits], vector_hits):
+            for rank, doc in enumerate(ranking):
+                key = _doc_key(doc)
+                docs[key] = doc
+                fused[key] = fused.get(key, 0.0) + 1 / (RRF_K + rank + 1)
+        best = sorted(fused, key=fused.get, reverse=True)[:self.k]
+        return [docs[key] for key in best]
+
+
+# BM25 одного объекта индекса живет, пока жив сам индекс
+_bm25_indexes = weakref.WeakKeyDictionary()
+_bm25_lock = threading.Lock()
+
+
+def _document_getter(vectorstore):
+    """Document по позиции в FAISS-индексе; ссылка на vectorstore слабая, чтобы не держать его в кэше."""
+    ref = weakref.ref(vectorstore)
+
+    def document(position: int) -> Document:
+        store = ref()
+        return store.docstore.search(store.index_to_docstore_id[position])
+
+    return document
+
+
+def attach_bm25(vectorstore, prefix: str) -> None:
+    """Подключает к vectorstore BM25Index, сохраненный вместе с ним (BM25Index.save)."""
+    index = BM25Index.load(prefix, _document_getter(vectorstore))
+    with _bm25_lock:
+        _bm25_indexes[vectorstore] = index
+
+
+def bm25_for(vectorstore) -> BM25Index:
+    """
+    BM25Index по всем чанкам FAISS-индекса, общий для всех сессий.
+
+    Обычно он загружен вместе с индексом (attach_bm25); для индекса без
+    сохраненного BM25 строится в памяти по всем чанкам при первом обращении.
+    """
+    with _bm25_lock:
+        index = _bm25_indexes.get(vectorstore)
+        if index is None:
+            document = _document_getter(vectorstore)
+            texts = (document(i).page_content for i in range(len(vectorstore.index_to_docstore_id)))
+            index = BM25Index.build(texts, document)
+            _bm25_indexes[vectorstore] = index
+        return index
+
+
+def hybrid_retriever(vectorstore, k: int = 2) -> HybridRetriever:
+    return HybridRetriever(vectorstore=vectorstore, bm25=bm25_for(vectorstore), k=k)
@@ -1,10 +1,284 @@
-import json
+from functools import partial
+
 import streamlit as st
 from pydantic import BaseModel
 from langchain.chat_models import init_chat_model
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import PydanticOutputParser
 
+from functions.log_loader import LOGS_PATH, LogIndex, list_log_files
+from functions.severity_cache import SeverityCache, severity_cache_key
+from functions.severity_rules import preclassify
+
+
+# Максимальное число одновременных запросов к LLM при оценке критичности
+SEVERITY_MAX_CONCURRENCY = 8
+
+# Пакетный режим: бюджет токенов на один запрос и максимум событий в пакете
+SEVERITY_BATCH_TOKEN_BUDGET = 3000
+SEVERITY_BATCH_MAX_ITEMS = 25
+
+# Сколько событий с полными items читается с диска за раз при оценке критичности
+SEVERITY_PAGE_SIZE = 1000
+
+# Размеры страницы таблицы событий
+DISPLAY_PAGE_SIZES = [25, 50, 100, 200]
+SEVERITY_FILTER_OPTIONS = ["high", "mid", "low", "n/a", "—"]
+
+
+# ---------------------- ВСПОМОГАТЕЛЬНЫЕ ФУНКЦИИ ----------------------
+
+def build_severity_input(log: dict) -> str:
+    """Формирует текст запроса к LLM для одного event_type."""
+    item_descriptions = [
+        f'IP: {item["ip"]}, Count: {item["count"]}, Message: {item["message"]}'
+        for item in log["items"]
+    ]
+    combined_items = "\n".join(item_descriptions)
+    return (
+        f'Event Type: {log["event_type"]}\n'
+        f'Total Count: {log["count"]}\n'
+        f'Items:\n{combined_items}'
+    )
+
+
+def classify_severity(chain, logs: list, max_concurrency: int = SEVERITY_MAX_CONCURRENCY, on_progress=None):
+    """
+    Оценивает критичность событий параллельно.
+
+    Одновременно выполняется не более max_concurrency запросов к LLM.
+    on_progress(done, total) вызывается после каждого полученного ответа.
+    Для событий, по которым произошла ошибка, критичность равна "n/a".
+
+    Возвращает кортеж (severity_map, errors), где errors — {event_type: исключение}.
+    """
+    severity_map = {}
+    errors = {}
+
+    inputs = []
+    pending = []
+    for log in logs:
+        try:
+            inputs.append({"log": build_severity_input(log)})
+            pending.append(log["event_type"])
+        except Exception as e:
+            severity_map[log["event_type"]] = "n/a"
+            errors[log["event_type"]] = e
+
+    total = len(logs)
+    done = len(severity_map)
+    if on_progress:
+        on_progress(done, total)
+
+    results = chain.batch_as_completed(
+        inputs,
+        config={"max_concurrency": max_concurrency},
+        return_exceptions=True,
+    )
+    for index, result in results:
+        event_type = pending[index]
+        if isinstance(result, Exception):
+            severity_map[event_type] = "n/a"
+            errors[event_type] = result
+        else:
+            severity_map[event_type] = result.severity
+        done += 1
+        if on_progress:
+            on_progress(done, total)
+
+    return severity_map, errors
+
+
+def estimate_tokens(text: str) -> int:
+    """Грубая оценка числа токенов: ~4 символа на токен."""
+    return len(text) // 4 + 1
+
+
+def split_by_token_budget(
+    logs: list,
+    token_budget: int = SEVERITY_BATCH_TOKEN_BUDGET,
+    max_items: int = SEVERITY_BATCH_MAX_ITEMS,
+) -> list:
+    """
+    Делит события на пакеты так, чтобы текст пакета укладывался в token_budget.
+
+    Событие, которое само по себе больше бюджета, попадает в отдельный пакет.
+    """
+    batches = []
+    batch = []
+    batch_tokens = 0
+    for log in logs:
+        tokens = estimate_tokens(build_severity_input(log))
+        if batch and (batch_tokens + tokens > token_budget or len(batch) >= max_items):
+            batches.append(batch)
+            batch = []
+            batch_tokens = 0
+        batch.append(log)
+        batch_tokens += tokens
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def build_severity_batch_input(logs: list) -> str:
+    """Объединяет несколько событий в один запрос, каждое под заголовком '### <event_type>'."""
+    return "\n\n".join(
+        f'### {log["event_type"]}\n{build_severity_input(log)}' for log in logs
+    )
+
+
+def _offset_progress(on_progress, offset: int, total: int):
+    """on_progress(done, total) для части работы, начинающейся с offset выполненных; None без on_progress."""
+    if on_progress is None:
+        return None
+    return lambda done, _part_total: on_progress(offset + done, total)
+
+
+def classify_severity_batched(
+    batch_chain,
+    chain,
+    logs: list,
+    token_budget: int = SEVERITY_BATCH_TOKEN_BUDGET,
+    max_items: int = SEVERITY_BATCH_MAX_ITEMS,
+    max_concurrency: int = SEVERITY_MAX_CONCURRENCY,
+    on_progress=None,
+):
+    """
+    Оценивает критичность пакетами: несколько событий в одном запросе к LLM.
+
+    batch_chain должна возвращать объект с полем entries (список LogEntry, где
+    message — event_type). События, которые не удалось разобрать из ответа
+    (или весь пакет при ошибке), повторно оцениваются по одному через chain.
+
+    Возвращает кортеж (severity_map, errors), как classify_severity().
+    """
+    severity_map = {}
+    errors = {}
+
+    # Некорректные записи сразу уходят на поштучную оценку, где получат "n/a"
+    valid = []
+    retry = []
+    for log in logs:
+        try:
+            build_severity_input(log)
+            valid.append(log)
+        except Exception:
+            retry.append(log)
+
+    batches = split_by_token_budget(valid, token_budget, max_items)
+    inputs = [{"logs": build_severity_batch_input(batch)} for batch in batches]
+
+    total = len(logs)
+    done = 0
+    if on_progress:
+        on_progress(done, total)
+
+    results = batch_chain.batch_as_completed(
+        inputs,
+        config={"max_concurrency": max_concurrency},
+        return_exceptions=True,
+    )
+    for index, result in results:
+        parsed = {}
+        if not isinstance(result, Exception):
+            parsed = {entry.message: entry.severity for entry in result.entries}
+        for log in batches[index]:
+            if log["event_type"] in parsed:
+                severity_map[log["event_type"]] = parsed[log["event_type"]]
+                done += 1
+            else:
+                retry.append(log)
+        if on_progress:
+            on_progress(done, total)
+
+    if retry:
+        # Прогресс поштучной оценки продолжает счет после пакетов
+        retry_map, retry_errors = classify_severity(
+            chain, retry, max_concurrency=max_concurrency,
+            on_progress=_offset_progress(on_progress, done, total),
+        )
+        severity_map.update(retry_map)
+        errors.update(retry_errors)
+        done += len(retry)
+        if on_progress:
+            on_progress(done, total)
+
+    return severity_map, errors
+
+
+def classify_severity_cached(classify, logs: list, cache: SeverityCache, model_name: str, on_progress=None):
+    """
+    Оценивает критичность функцией classify(logs, on_progress=...), но сначала ищет оценки в кэше.
+
+    В LLM уходят только новые или изменившиеся event_type, успешные ответы
+    сохраняются в кэш. Оценки "n/a" не кэшируются. on_progress(done, total)
+    считает по всем logs: найденные в кэше сразу учитываются как готовые.
+    """
+    cache_keys = {}
+    for log in logs:
+        try:
+            cache_keys[log["event_type"]] = severity_cache_key(log, model_name)
+        except Exception:
+            pass
+
+    cached = cache.get_many(list(cache_keys.values()))
+    severity_map = {
+        event_type: cached[key]
+        for event_type, key in cache_keys.items()
+        if key in cached
+    }
+
+    to_classify = [log for log in logs if log.get("event_type") not in severity_map]
+    cached_count = len(logs) - len(to_classify)
+
+    if on_progress:
+        on_progress(cached_count, len(logs))
+
+    llm_map, errors = classify(to_classify, on_progress=_offset_progress(on_progress, cached_count, len(logs)))
+    severity_map.update(llm_map)
+
+    cache.put_many([
+        (cache_keys[event_type], event_type, severity)
+        for event_type, severity in llm_map.items()
+        if event_type not in errors and event_type in cache_keys
+    ])
+
+    return severity_map, errors
+
+
+def build_display_row(entry: dict) -> dict:
+    """Строка таблицы для одного события."""
+    return {
+        "Event type": entry["event_type"],
+        "Example": entry["example"],
+        "Devices": ", ".join(entry["ips"]),
+        "Count": entry["count"],
+        "Severity": entry.get("severity") or "—",
+    }
+
+
+def filter_entries(entries: list, severities: list, ip: str, text: str) -> list:
+    """
+    Отбирает события по критичности, IP устройства и тексту.
+
+    ip ищется как подстрока в IP устройств, text — без учета регистра
+    в event_type и примере сообщения. Порядок entries сохраняется.
+    """
+    ip = ip.strip()
+    text = text.strip().lower()
+    severities = set(severities)
+
+    result = []
+    for entry in entries:
+        if severities and (entry.get("severity") or "—") not in severities:
+            continue
+        if ip and not any(ip in entry_ip for entry_ip in entry["ips"]):
+            continue
+        if text and text not in entry["event_type"].lower() and text not in entry["example"].lower():
+            continue
+        result.append(entry)
+    return result
+
 
 def log_analysis_main():
     st.title("AI Assistant — Logs analyzer")
@@ -14,13 +288,35 @@ def log_analysis_main():
         ["gpt-4o-mini", "gpt-3.5-turbo", "gpt-4o"]
     )
 
+    max_concurrency = st.sidebar.slider(
+        "Параллельных запросов к LLM:",
+        min_value=1,
+        max_value=32,
+        value=SEVERITY_MAX_CONCURRENCY,
+    )
+
+    use_rules = st.sidebar.checkbox("Правила до LLM (по уровню в мнемонике)", value=True)
+    batch_mode = st.sidebar.checkbox("Пакетная оценка критичности", value=True)
+    batch_token_budget = st.sidebar.number_input(
+        "Бюджет токенов на пакет:",
+        min_value=500,
+        max_value=100000,
+        value=SEVERITY_BATCH_TOKEN_BUDGET,
+        step=500,
+        disabled=not batch_mode,
+    )
+
     # ---------------------------- STRUCT ----------------------------
 
     class LogEntry(BaseModel):
         message: str
         severity: str  # Возможные значения: low, mid, high
 
+    class LogEntryBatch(BaseModel):
+        entries: list[LogEntry]
+
     parser = PydanticOutputParser(pydantic_object=LogEntry)
+    batch_parser = PydanticOutputParser(pydantic_object=LogEntryBatch)
 
     # ---------------------------- PROMPTS ----------------------------
 
@@ -31,6 +327,15 @@ def log_analysis_main():
         "{{" + parser.get_format_instructions().replace("{", "{{").replace("}", "}}") + "}}"
     )
 
+    SEVERITY_BATCH_PROMPT = (
+        "Ты ассистент по анализу логов сетевого оборудования Cisco Systems.\n"
+        "Пользователь передает несколько событий, каждое начинается со строки '### <Event Type>'.\n"
+        "Для каждого события определи критичность: 'low', 'mid' или 'high'.\n"
+        "В поле message укажи Event Type события без изменений.\n"
+        "Ответ верни строго в формате ниже (JSON), по одной записи на каждое событие:\n\n"
+        "{{" + batch_parser.get_format_instructions().replace("{", "{{").replace("}", "}}") + "}}"
+    )
+
     EXPLANATION_PROMPT = (
         "Ты сетевой инженер с опытом в Cisco IOS.\n"
         "Объясни лог, который предоставил пользователь.\n"
@@ -48,18 +353,23 @@ def log_analysis_main():
 
     # ---------------------------- LOAD LOGS ----------------------------
 
+    log_path = st.selectbox("Файл логов:", list_log_files() or [LOGS_PATH])
+
     if st.button("Загрузить логи"):
         try:
-            with open("logs/logs.json", "r") as file:
-                logs = json.load(file)
-            st.session_state["logs"] = logs
+            # В session_state только компактный индекс, items читаются с диска по требованию
+            index = LogIndex.build(log_path)
+            st.session_state["log_index"] = index
             st.session_state["severity_done"] = False
-            st.success(f"Загружено записей: {len(logs)}")
+            st.session_state["logs_version"] = st.session_state.get("logs_version", 0) + 1
+            st.session_state["display_rows"] = {}
+            st.success(f"Загружено записей: {len(index)}")
         except Exception as error:
             st.error(f"Ошибка при загрузке логов: {error}")
 
-    if "logs" in st.session_state:
-        logs = st.session_state["logs"]
+    if "log_index" in st.session_state:
+        index = st.session_state["log_index"]
+        logs = index.entries
 
     # ---------------------------- SEVERITY ----------------------------
 
@@ -71,31 +381,78 @@ def log_analysis_main():
                 ])
                 chain = severity_prompt | llm | parser
 
-                severity_map = {}
-
-                for log in logs:
-                    try:
-                        item_descriptions = [
-                            f'IP: {item["ip"]}, Count: {item["count"]}, Message: {item["message"]}'
-                            for item in log["items"]
-                        ]
-                        combined_items = "\n".join(item_descriptions)
-                        input_msg = (
-                            f'Event Type: {log["event_type"]}\n'
-                            f'Total Count: {log["count"]}\n'
-                            f'Items:\n{combined_items}'
-                        )
-
-                        result = chain.invoke({"log": input_msg})
-                        severity_map[log["event_type"]] = result.severity
-                    except Exception as e:
-                        severity_map[log["event_type"]] = "n/a"
-                        st.warning(f"Ошибка для event_type '{log['event_type']}': {e}")
+                if batch_mode:
+                    severity_batch_prompt = ChatPromptTemplate.from_messages([
+                        ("system", SEVERITY_BATCH_PROMPT),
+                        ("user", "{logs}")
+                    ])
+                    batch_chain = severity_batch_prompt | llm | batch_parser
+
+                progress = st.progress(0.0, text="Оценка критичности: 0 из 0")
+                progress_offset = 0
+                progress_total = 0
+
+                def on_progress(done, total):
+                    done += progress_offset
+                    progress.progress(
+                        done / progress_total if progress_total else 1.0,
+                        text=f"Оценка критичности: {done} из {progress_total}"
+                    )
+
+                cache = SeverityCache()
+                if batch_mode:
+                    classify = partial(
+                        classify_severity_batched,
+                        batch_chain,
+                        chain,
+                        token_budget=batch_token_budget,
+                        max_concurrency=max_concurrency,
+                    )
+                else:
+                    classify = partial(
+                        classify_severity,
+                        chain,
+                        max_concurrency=max_concurrency,
+                    )
+
+                if use_rules:
+                    severity_map, remaining = preclassify(logs)
+                else:
+                    severity_map, remaining = {}, logs
+
+                # Полные записи читаются с диска страницами за один проход по файлу,
+                # чтобы не держать все items в памяти
+                errors = {}
+                progress_total = len(remaining)
+                for page_number, page in enumerate(index.iter_pages(SEVERITY_PAGE_SIZE, remaining)):
+                    progress_offset = page_number * SEVERITY_PAGE_SIZE
+                    page_map, page_errors = classify_severity_cached(
+                        classify, page, cache, model_name, on_progress=on_progress
+                    )
+                    severity_map.update(page_map)
+                    errors.update(page_errors)
+
+                stats = cache.stats()
+                avoided = len(logs) - stats["misses"]
+                st.caption(
+                    f"Запросов к LLM сэкономлено: {avoided} из {len(logs)} "
+                    f"(по правилам {len(logs) - len(remaining)}, из кэша {stats['hits']})"
+                )
+                st.caption(
+                    f"Кэш критичности: из кэша {stats['hits']}, запросов к LLM {stats['misses']} "
+                    f"(hit rate {stats['hit_rate']:.0%}, записей в кэше {stats['size']})"
+                )
+
+                for event_type, e in errors.items():
+                    st.warning(f"Ошибка для event_type '{event_type}': {e}")
 
                 for log in logs:
                     log["severity"] = severity_map.get(log["event_type"], "n/a")
 
+                index.invalidate()
                 st.session_state["severity_done"] = True
+                st.session_state["logs_version"] += 1
+                st.session_state["display_rows"] = {}
 
         # ---------------------------- SORTING ----------------------------
 
@@ -105,43 +462,69 @@ def log_analysis_main():
             if not st.session_state.get("severity_done"):
                 st.warning("Сначала выполните оценку критичности логов")
                 return
-            logs.sort(
-                key=lambda x: {"high": 0, "mid": 1, "low": 2}.get(x.get("severity", "mid"), 1)
-            )
+            sorted_logs = index.sorted_entries("severity")
         else:
-            logs.sort(key=lambda x: x["count"], reverse=True)
+            sorted_logs = index.sorted_entries("count")
+
+        # ---------------------------- FILTERS ----------------------------
+
+        col_severity, col_ip, col_text = st.columns(3)
+        severity_filter = col_severity.multiselect("Критичность:", SEVERITY_FILTER_OPTIONS)
+        ip_filter = col_ip.text_input("IP устройства:")
+        text_filter = col_text.text_input("Поиск по тексту:")
+
+        # Результат фильтрации пересчитывается только при изменении фильтров,
+        # сортировки или данных, а не на каждом rerun
+        filter_key = (
+            st.session_state["logs_version"],
+            sort_by,
+            tuple(severity_filter),
+            ip_filter,
+            text_filter,
+        )
+        if st.session_state.get("filter_key") != filter_key:
+            st.session_state["filtered_logs"] = filter_entries(
+                sorted_logs, severity_filter, ip_filter, text_filter
+            )
+            st.session_state["filter_key"] = filter_key
+        filtered = st.session_state["filtered_logs"]
 
         # ---------------------------- DISPLAY ----------------------------
 
-        messages_list = [f'{i + 1}. {log["event_type"]}' for i, log in enumerate(logs)]
-
-        for index, log in enumerate(logs, start=1):
-            event_type = log["event_type"]
-            example = log["items"][0]["message"] if log["items"] else "(нет примера)"
-            ips = ", ".join({item["ip"] for item in log["items"]})
-            count = log["count"]
-            severity = log.get("severity", "—")
-
-            st.markdown(f"""
-            <div style="font-size: 16px; line-height: 1.4; margin-bottom: 6px;">
-                <b>N:</b> {index}<br>
-                <b>Event type:</b> {event_type}<br>
-                <b>Example:</b> {example}<br>
-                <b>Devices:</b> {ips}<br>
-                <b>Count:</b> {count}<br>
-                <b>Severity:</b> {severity}
-            </div>
-            <hr style="margin: 6px 0;">
-            """, unsafe_allow_html=True)
+        col_size, col_page = st.columns(2)
+        page_size = col_size.selectbox("Событий на странице:", DISPLAY_PAGE_SIZES)
+        page_count = max(1, -(-len(filtered) // page_size))
+        page = col_page.number_input(
+            f"Страница (из {page_count}):", min_value=1, max_value=page_count, value=1
+        )
+
+        start = (page - 1) * page_size
+        page_logs = filtered[start:start + page_size]
+
+        # Строки таблицы строятся один раз на событие и переиспользуются между rerun
+        display_rows = st.session_state["display_rows"]
+        rows = []
+        for number, log in enumerate(page_logs, start=start + 1):
+            row = display_rows.get(log["event_type"])
+            if row is None:
+                row = display_rows[log["event_type"]] = build_display_row(log)
+            rows.append({"N": number, **row})
+
+        st.caption(f"Найдено событий: {len(filtered)} из {len(logs)}")
+        st.dataframe(rows, hide_index=True, use_container_width=True)
+
+        if not page_logs:
+            return
 
         # ---------------------------- ANALYZE SELECTED ----------------------------
 
+        messages_list = [f'{row["N"]}. {row["Event type"]}' for row in rows]
         selected_index = messages_list.index(
             st.selectbox("🔍 Выберите лог для анализа", messages_list)
         )
-        selected_info = logs[selected_index]
-
-        if selected_info and st.button("Проанализировать"):
+        if st.button("Проанализировать"):
+            # Полная запись читается с диска только по нажатию, а не на каждом rerun
+            selected_info = index.load(page_logs[selected_index])
             event_type = selected_info["event_type"]
             count = selected_info["count"]
 
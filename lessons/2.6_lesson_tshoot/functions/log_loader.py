@@ -0,0 +1,268 @@
+import codecs
+import gzip
+import io
+import json
+import os
+import shutil
+import tempfile
+import weakref
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+# Файл с агрегированными логами и размер блока чтения (байты)
+LOGS_DIR = "logs"
+LOGS_PATH = "logs/logs.json"
+READ_CHUNK_SIZE = 1 << 20
+
+# Поддерживаемые форматы: JSON-массив и NDJSON, NDJSON может быть сжат gzip или zstd
+LOG_FILE_SUFFIXES = (".json", ".ndjson", ".jsonl", ".ndjson.gz", ".jsonl.gz", ".ndjson.zst", ".jsonl.zst")
+
+# Порядок критичности для сортировки; неизвестные значения считаются "mid"
+SEVERITY_RANK = {"high": 0, "mid": 1, "low": 2}
+
+# Ключи сортировки событий в индексе
+SORT_KEYS = {
+    "count": lambda entry: -entry["count"],
+    "severity": lambda entry: (SEVERITY_RANK.get(entry.get("severity"), 1), -entry["count"]),
+}
+
+_decoder = json.JSONDecoder()
+
+
+def _iter_json_array(file):
+    """
+    Потоково разбирает JSON-массив верхнего уровня из бинарного файла.
+
+    Выдает (offset, length, record), где offset и length — положение записи
+    в файле в байтах. В памяти держится только текущий блок файла.
+    """
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    buffer = ""
+    base = 0        # смещение начала buffer в файле (байты)
+    pos = 0         # позиция разбора внутри buffer (символы)
+    pos_bytes = 0   # та же позиция в байтах относительно начала buffer
+    started = False
+    eof = False
+
+    while True:
+        # Пропускаем пробелы и разделители между элементами (все ASCII)
+        while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+            pos += 1
+            pos_bytes += 1
+        if not started and pos < len(buffer):
+            if buffer[pos] != "[":
+                raise ValueError("Ожидается JSON-массив в начале файла")
+            started = True
+            pos += 1
+            pos_bytes += 1
+            continue
+        if started and pos < len(buffer) and buffer[pos] == "]":
+            return
+
+        try:
+            if pos >= len(buffer):
+                raise ValueError("buffer is empty")
+            record, end = _decoder.raw_decode(buffer, pos)
+        except ValueError:
+            if eof:
+                # Массив заканчивается на "]" выше; конец файла до него (в том числе
+                # пустой файл) — обрезанный файл, как и незаконченная запись
+                raise ValueError("Файл логов обрезан или поврежден")
+            # Отбрасываем разобранное начало и дочитываем следующий блок
+            base += pos_bytes
+            buffer = buffer[pos:]
+            pos = 0
+            pos_bytes = 0
+            chunk = file.read(READ_CHUNK_SIZE)
+            eof = not chunk
+            buffer += utf8.decode(chunk, final=eof)
+            continue
+
+        length = len(buffer[pos:end].encode("utf-8"))
+        yield base + pos_bytes, length, record
+        pos = end
+        pos_bytes += length
+
+
+def _iter_ndjson(file):
+    """Разбирает NDJSON: одна запись на строку. Выдает (offset, length, record)."""
+    offset = 0
+    for line in file:
+        if line.strip():
+            yield offset, len(line), json.loads(line)
+        offset += len(line)
+
+
+def _is_compressed(path: str) -> bool:
+    return path.endswith((".gz", ".zst"))
+
+
+def _open_binary(path: str):
+    """Открывает файл логов на чтение, распаковывая .gz и .zst на лету."""
+    if path.endswith(".gz"):
+        return gzip.open(path, "rb")
+    if path.endswith(".zst"):
+        if zstandard is None:
+            raise RuntimeError("Для чтения .zst установите пакет zstandard")
+        reader = zstandard.ZstdDecompressor().stream_reader(open(path, "rb"))
+        return io.BufferedReader(reader)
+    return open(path, "rb")
+
+
+def _decompress_to_temp(path: str) -> str:
+    """
+    Распаковывает .gz/.zst во временный файл и возвращает его путь.
+
+    Имя временного файла оканчивается на имя исходного без расширения сжатия,
+    чтобы iter_log_records() определил формат так же.
+    """
+    name = os.path.basename(path[:path.rindex(".")])
+    fd, temp_path = tempfile.mkstemp(prefix="logs-", suffix="-" + name)
+    try:
+        with _open_binary(path) as source, os.fdopen(fd, "wb") as target:
+            shutil.copyfileobj(source, target, READ_CHUNK_SIZE)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+    return temp_path
+
+
+def _read_record(file, entry: dict) -> dict:
+    file.seek(entry["offset"])
+    record = json.loads(file.read(entry["length"]))
+    # Критичность в индексе актуальнее, чем в исходном файле
+    if entry.get("severity") is not None:
+        record["severity"] = entry["severity"]
+    return record
+
+
+def list_log_files(logs_dir: str = LOGS_DIR) -> list:
+    """Файлы логов в каталоге logs_dir в поддерживаемых форматах."""
+    if not os.path.isdir(logs_dir):
+        return []
+    return sorted(
+        os.path.join(logs_dir, name)
+        for name in os.listdir(logs_dir)
+        if name.endswith(LOG_FILE_SUFFIXES)
+    )
+
+
+def iter_log_records(path: str = LOGS_PATH):
+    """
+    Лениво читает агрегированные события из JSON-массива или NDJSON (.ndjson, .jsonl,
+    в том числе сжатых .gz/.zst).
+
+    Выдает (offset, length, record) для каждого event_type. Для сжатых файлов
+    offset указывает на позицию в распакованном потоке.
+    """
+    name = path[:path.rindex(".")] if _is_compressed(path) else path
+    with _open_binary(path) as file:
+        if name.endswith((".ndjson", ".jsonl")):
+            yield from _iter_ndjson(file)
+        else:
+            yield from _iter_json_array(file)
+
+
+class LogIndex:
+    """
+    Компактный индекс загруженных логов.
+
+    Для каждого event_type хранит только счетчик, критичность, один пример
+    сообщения, список IP и положение записи в файле. Полные items
+    читаются с диска по требованию через load()/load_many().
+
+    Сжатый файл (.gz/.zst) распаковывается один раз при build() во временный
+    файл, который удаляется вместе с индексом: чтение записи по смещению —
+    это seek, а не распаковка потока с начала. path — файл, из которого
+    читаются записи, source_path — исходный файл логов.
+
+    Порядок entries не меняется: сортировки хранятся отдельно как
+    перестановки и считаются один раз до вызова invalidate().
+    """
+
+    def __init__(self, path: str, entries: list, source_path: str = None):
+        self.path = path
+        self.source_path = source_path or path
+        self.entries = entries
+        self._orders = {}
+        self._views = {}
+
+    @classmethod
+    def build(cls, path: str = LOGS_PATH):
+        if not _is_compressed(path):
+            return cls(path, cls._build_entries(path))
+        temp_path = _decompress_to_temp(path)
+        try:
+            index = cls(temp_path, cls._build_entries(temp_path), source_path=path)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+        weakref.finalize(index, os.remove, temp_path)
+        return index
+
+    @staticmethod
+    def _build_entries(path: str) -> list:
+        entries = []
+        for offset, length, record in iter_log_records(path):
+            items = record.get("items", [])
+            entries.append({
+                "event_type": record["event_type"],
+                "count": record["count"],
+                "severity": record.get("severity"),
+                "example": items[0]["message"] if items else "(нет примера)",
+                "ips": sorted({item["ip"] for item in items}),
+                "offset": offset,
+                "length": length,
+            })
+        return entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def order(self, by: str) -> list:
+        """Перестановка индексов entries, отсортированных по ключу by ('count' или 'severity')."""
+        if by not in self._orders:
+            key = SORT_KEYS[by]
+            keys = [key(entry) for entry in self.entries]
+            self._orders[by] = sorted(range(len(keys)), key=keys.__getitem__)
+        return self._orders[by]
+
+    def sorted_entries(self, by: str) -> list:
+        """Список событий в порядке order(by); исходный entries не изменяется."""
+        if by not in self._views:
+            self._views[by] = [self.entries[i] for i in self.order(by)]
+        return self._views[by]
+
+    def invalidate(self) -> None:
+        """Сбрасывает сохраненные сортировки, например после оценки критичности."""
+        self._orders.clear()
+        self._views.clear()
+
+    def load(self, entry: dict) -> dict:
+        """Читает полную запись события (с items) с диска."""
+        return self.load_many([entry])[0]
+
+    def load_many(self, entries: list) -> list:
+        """Читает полные записи для списка элементов индекса за одно открытие файла."""
+        order = sorted(range(len(entries)), key=lambda i: entries[i]["offset"])
+        records = [None] * len(entries)
+        with open(self.path, "rb") as file:
+            for i in order:
+                records[i] = _read_record(file, entries[i])
+        return records
+
+    def iter_pages(self, page_size: int, entries: list = None):
+        """
+        Выдает полные записи entries (по умолчанию всех событий) страницами по page_size.
+
+        Файл открывается один раз и читается в порядке смещений, поэтому
+        страницы идут в порядке записей в файле, а не в порядке entries.
+        """
+        entries = sorted(self.entries if entries is None else entries, key=lambda entry: entry["offset"])
+        with open(self.path, "rb") as file:
+            for start in range(0, len(entries), page_size):
+                yield [_read_record(file, entry) for entry in entries[start:start + page_size]]
@@ -0,0 +1,597 @@
+import hashlib
+import json
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import faiss
+import numpy as np
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.document_loaders import TextLoader
+from langchain_community.vectorstores import FAISS
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from functions.chunk_store import MmapDocstore, PositionIds, read_chunks, write_chunks
+from functions.hybrid_retriever import BM25_ARRAYS, BM25Index, attach_bm25, hybrid_retriever
+from functions.vector_index import (
+    DEFAULT_INDEX_TYPE,
+    REBUILD_ON_DELETE,
+    TRAIN_SIZE,
+    TRAINED_TYPES,
+    configure_search,
+    create_index,
+    mmap_io_flags,
+    needs_retrain,
+)
+
+
+# Каталог документов для RAG и каталог сохраненных индексов
+DOCS_PATH = "./docs"
+INDEX_DIR = "./cache/faiss"
+
+# Параметры разбиения документов по умолчанию
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 200
+
+MANIFEST_NAME = "manifest.json"
+INDEX_PARAMS_NAME = "index_params.json"
+
+# Файлы индекса одного поколения: index-<поколение>.faiss, chunks-<поколение>.*
+# (chunk_store), bm25-<поколение>.* (BM25Index.save) и manifest-<поколение>.json;
+# index.faiss / index.pkl / manifest.json — прежний формат FAISS.save_local
+INDEX_FILE = "index-{generation}.faiss"
+CHUNKS_PREFIX = "chunks-{generation}"
+BM25_PREFIX = "bm25-{generation}"
+MANIFEST_FILE = "manifest-{generation}.json"
+GENERATION_PREFIXES = ("index-", "chunks-", "bm25-", "manifest-")
+LEGACY_FILES = ("index.faiss", "index.pkl", MANIFEST_NAME)
+LOAD_ATTEMPTS = 3
+
+# Параллельная индексация: потоки читают файлы, процессы разбивают их на чанки.
+# SPLIT_WINDOW — сколько файлов одновременно в работе, EMBED_BATCH_SIZE — чанков
+# в одном пакете для embeddings. Меньше PARALLEL_MIN_FILES файлов — без пулов.
+LOAD_WORKERS = 8
+SPLIT_WORKERS = os.cpu_count() or 1
+SPLIT_WINDOW = 4 * SPLIT_WORKERS
+EMBED_BATCH_SIZE = 2048
+PARALLEL_MIN_FILES = 32
+# Процессы запускаются через spawn: fork из многопоточного сервера Streamlit
+# копирует захваченные другими потоками блокировки и может зависнуть
+SPLIT_MP_CONTEXT = multiprocessing.get_context("spawn")
+
+# Общие для всех сессий Streamlit индексы:
+# {(docs_path, chunk_size, chunk_overlap, модель эмбеддингов): vectorstore}
+_registry = {}
+_registry_lock = threading.Lock()
+_build_locks = {}
+
+
+def file_hash(path: str) -> str:
+    """sha256 содержимого файла."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def list_doc_files(docs_path: str = DOCS_PATH) -> list:
+    """Файлы документов (без скрытых) относительно docs_path, как их видит DirectoryLoader."""
+    files = []
+    for root, dirs, names in os.walk(docs_path):
+        dirs[:] = [d for d in dirs if not d.startswith(".")]
+        for name in names:
+            if not name.startswith("."):
+                files.append(os.path.relpath(os.path.join(root, name), docs_path))
+    return sorted(files)
+
+
+def embeddings_name(embeddings) -> str:
+    """Имя модели эмбеддингов: векторы разных моделей нельзя смешивать в одном индексе."""
+    return getattr(embeddings, "model_name", None) or getattr(embeddings, "model", type(embeddings).__name__)
+
+
+def index_path(
+    docs_path: str,
+    chunk_size: int,
+    chunk_overlap: int,
+    index_dir: str = INDEX_DIR,
+    model_name: str = "",
+) -> str:
+    """Каталог индекса: свой для каждого каталога документов, параметров разбиения и модели эмбеддингов."""
+    name = hashlib.sha256(f"{os.path.abspath(docs_path)}\n{model_name}".encode("utf-8")).hexdigest()[:12]
+    return os.path.join(index_dir, f"{name}-{chunk_size}-{chunk_overlap}")
+
+
+def load_manifest(path: str, params: dict = None) -> dict:
+    """
+    Манифест индекса: {relpath: {"hash": sha256, "ids": [id чанков]}}.
+
+    Читается манифест поколения из params (по умолчанию — текущего по
+    index_params.json), поэтому он всегда соответствует индексу этого поколения.
+    """
+    if params is None:
+        params = load_index_params(path)
+    if "generation" in params:
+        manifest_path = os.path.join(path, MANIFEST_FILE.format(generation=params["generation"]))
+    else:
+        manifest_path = os.path.join(path, MANIFEST_NAME)
+    if not os.path.exists(manifest_path):
+        return {}
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        return json.load(f)["files"]
+
+
+def _write_json(file_path: str, data: dict) -> None:
+    # Запись через временный файл, чтобы прерванное сохранение не портило файл
+    tmp_path = file_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, file_path)
+
+
+def load_index_params(path: str) -> dict:
+    """
+    Тип и параметры FAISS-индекса (create_index()).
+
+    Хранятся отдельно от манифеста, чтобы их можно было читать на каждом
+    перезапуске скрипта Streamlit. Индексы без файла параметров — Flat.
+    """
+    params_path = os.path.join(path, INDEX_PARAMS_NAME)
+    if not os.path.exists(params_path):
+        return {"type": DEFAULT_INDEX_TYPE, "factory": "Flat"}
+    with open(params_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_index_params(path: str, params: dict) -> None:
+    _write_json(os.path.join(path, INDEX_PARAMS_NAME), params)
+
+
+def _remove_generations(path: str, keep=None) -> None:
+    """Удаляет файлы всех поколений, кроме keep, и файлы прежнего формата."""
+    current = tuple(f"{prefix}{keep}." for prefix in GENERATION_PREFIXES) if keep is not None else ()
+    for name in os.listdir(path):
+        if name in LEGACY_FILES or (name.startswith(GENERATION_PREFIXES) and not name.startswith(current)):
+            os.remove(os.path.join(path, name))
+
+
+def save_vectorstore(path: str, vectorstore, params: dict, files: dict) -> None:
+    """
+    Сохраняет индекс и манифест files новым поколением файлов и переключает на него index_params.json.
+
+    Векторы пишутся faiss.write_index, тексты чанков — write_chunks() в порядке
+    позиций индекса, рядом — BM25Index по тем же чанкам для гибридного поиска,
+    чтобы процессы приложения не строили его заново, и манифест. Все файлы
+    поколения пишутся до переключения, поэтому одна запись index_params.json
+    меняет их вместе: прерванное сохранение оставляет прежнее поколение целым.
+    Файлы прежних поколений удаляются: процессы, которые уже
+    отобразили их в память, продолжают работать со старой версией до перезапуска.
+    """
+    os.makedirs(path, exist_ok=True)
+    generation = time.time_ns()
+    documents = [
+        vectorstore.docstore.search(vectorstore.index_to_docstore_id[i])
+        for i in range(vectorstore.index.ntotal)
+    ]
+    write_chunks(os.path.join(path, CHUNKS_PREFIX.format(generation=generation)), documents)
+    bm25 = BM25Index.build((doc.page_content for doc in documents), document=None)
+    bm25.save(os.path.join(path, BM25_PREFIX.format(generation=generation)))
+    faiss.write_index(vectorstore.index, os.path.join(path, INDEX_FILE.format(generation=generation)))
+    _write_json(os.path.join(path, MANIFEST_FILE.format(generation=generation)), {"files": files})
+    save_index_params(path, {**params, "generation": generation})
+    _remove_generations(path, keep=generation)
+
+
+def _load_generation(path: str, embeddings, params: dict, mmap: bool):
+    prefix = os.path.join(path, CHUNKS_PREFIX.format(generation=params["generation"]))
+    index_file = os.path.join(path, INDEX_FILE.format(generation=params["generation"]))
+    if mmap:
+        docstore = MmapDocstore(prefix)
+        index = faiss.read_index(index_file, mmap_io_flags(params))
+        index_to_docstore_id = PositionIds(len(docstore))
+    else:
+        documents = read_chunks(prefix)
+        index = faiss.read_index(index_file)
+        docstore = InMemoryDocstore({doc.id: doc for doc in documents})
+        index_to_docstore_id = {i: doc.id for i, doc in enumerate(documents)}
+    if index.ntotal != len(index_to_docstore_id):
+        raise RuntimeError(f"Индекс {index_file} не совпадает с текстами чанков")
+    configure_search(index, params)
+    vectorstore = FAISS(
+        embedding_function=embeddings,
+        index=index,
+        docstore=docstore,
+        index_to_docstore_id=index_to_docstore_id,
+    )
+    # BM25 нужен только индексу для поиска; поколения, сохраненные без него,
+    # получат BM25 в памяти при первом обращении (bm25_for)
+    bm25_prefix = os.path.join(path, BM25_PREFIX.format(generation=params["generation"]))
+    if mmap and os.path.exists(f"{bm25_prefix}.{BM25_ARRAYS[-1]}.npy"):
+        attach_bm25(vectorstore, bm25_prefix)
+    return vectorstore
+
+
+def load_vectorstore(path: str, embeddings, mmap: bool = False, params: dict = None):
+    """
+    Загружает сохраненный индекс и применяет его параметры поиска.
+
+    params — параметры из load_index_params(), если нужно именно это поколение
+    (например, то же, что и прочитанный манифест); по умолчанию — текущее.
+
+    mmap=True — векторы, тексты чанков и BM25 отображаются в память, а не читаются:
+    загрузка занимает миллисекунды при любом размере индекса, а процессы
+    приложения делят одни и те же страницы через кэш ОС. Такой индекс только
+    для чтения; build_index() загружает индекс с mmap=False.
+    """
+    fixed = params is not None
+    for attempt in range(LOAD_ATTEMPTS):
+        if not fixed:
+            params = load_index_params(path)
+        if "generation" not in params:
+            vectorstore = FAISS.load_local(path, embeddings, allow_dangerous_deserialization=True)
+            configure_search(vectorstore.index, params)
+            return vectorstore
+        try:
+            return _load_generation(path, embeddings, params, mmap)
+        except (FileNotFoundError, RuntimeError):
+            # Другой процесс успел сохранить новое поколение и удалить прочитанное — читаем заново
+            if (
+                fixed
+                or attempt == LOAD_ATTEMPTS - 1
+                or load_index_params(path).get("generation") == params["generation"]
+            ):
+                raise
+
+
+def load_file(docs_path: str, relpath: str) -> list:
+    """Загружает один файл; source совпадает с тем, что дает DirectoryLoader."""
+    return TextLoader(os.path.join(docs_path, relpath)).load()
+
+
+def split_documents(documents: list, chunk_size: int, chunk_overlap: int) -> list:
+    # Функция уровня модуля, чтобы ее можно было выполнить в ProcessPoolExecutor
+    splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    return splitter.split_documents(documents)
+
+
+def iter_file_splits(docs_path: str, relpaths: list, chunk_size: int, chunk_overlap: int):
+    """
+    Выдает (relpath, чанки) для файлов relpaths в том же порядке.
+
+    Файлы читаются в пуле потоков, разбиваются в пуле процессов. Одновременно
+    в работе не больше SPLIT_WINDOW файлов, поэтому память не зависит от
+    размера корпуса. Для небольшого числа файлов все выполняется в текущем потоке.
+    """
+    if len(relpaths) < PARALLEL_MIN_FILES:
+        for relpath in relpaths:
+            yield relpath, split_documents(load_file(docs_path, relpath), chunk_size, chunk_overlap)
+        return
+
+    files = iter(relpaths)
+    loads = deque()
+    splits = deque()
+    with ThreadPoolExecutor(LOAD_WORKERS) as loaders, ProcessPoolExecutor(SPLIT_WORKERS, mp_context=SPLIT_MP_CONTEXT) as splitters:
+
+        def refill():
+            while len(loads) + len(splits) < SPLIT_WINDOW:
+                relpath = next(files, None)
+                if relpath is None:
+                    return
+                loads.append((relpath, loaders.submit(load_file, docs_path, relpath)))
+
+        refill()
+        while loads or splits:
+            # Прочитанные файлы сразу уходят на разбиение; ждем чтения, только если разбивать нечего
+            while loads and (loads[0][1].done() or not splits):
+                relpath, future = loads.popleft()
+                splits.append((relpath, splitters.submit(split_documents, future.result(), chunk_size, chunk_overlap)))
+            relpath, future = splits.popleft()
+            yield relpath, future.result()
+            refill()
+
+
+def hash_files(docs_path: str, relpaths: list) -> dict:
+    """{relpath: sha256} для файлов docs_path; файлы читаются в пуле потоков."""
+    with ThreadPoolExecutor(LOAD_WORKERS) as pool:
+        digests = pool.map(lambda relpath: file_hash(os.path.join(docs_path, relpath)), relpaths)
+        return dict(zip(relpaths, digests))
+
+
+def _embedded_batches(embeddings, docs_path, relpaths, digests, files, chunk_size, chunk_overlap):
+    """
+    Выдает (чанки, ids, векторы float32) пакетами по EMBED_BATCH_SIZE чанков.
+
+    Файлы разбиваются по мере чтения (iter_file_splits), files пополняется
+    записями манифеста для relpaths.
+    """
+    batch = []
+    batch_ids = []
+    for relpath, splits in iter_file_splits(docs_path, relpaths, chunk_size, chunk_overlap):
+        digest = digests[relpath]
+        # id зависит от пути и содержимого файла, поэтому повторная индексация не дублирует чанки
+        ids = [f"{relpath}:{digest[:16]}:{i}" for i in range(len(splits))]
+        files[relpath] = {"hash": digest, "ids": ids}
+        batch.extend(splits)
+        batch_ids.extend(ids)
+        if len(batch) >= EMBED_BATCH_SIZE:
+            yield batch, batch_ids, _embed(embeddings, batch)
+            batch = []
+            batch_ids = []
+    if batch:
+        yield batch, batch_ids, _embed(embeddings, batch)
+
+
+def _embed(embeddings, documents: list) -> np.ndarray:
+    vectors = embeddings.embed_documents([doc.page_content for doc in documents])
+    return np.asarray(vectors, dtype=np.float32)
+
+
+def _add_batch(vectorstore, documents: list, ids: list, vectors: np.ndarray) -> None:
+    vectorstore.add_embeddings(
+        zip([doc.page_content for doc in documents], vectors),
+        metadatas=[doc.metadata for doc in documents],
+        ids=ids,
+    )
+
+
+def _new_vectorstore(embeddings, index_type: str, batches: list):
+    """Создает индекс index_type, обученный на векторах batches, и добавляет их в него."""
+    index, params = create_index(index_type, np.concatenate([vectors for _, _, vectors in batches]))
+    vectorstore = FAISS(
+        embedding_function=embeddings,
+        index=index,
+        docstore=InMemoryDocstore(),
+        index_to_docstore_id={},
+    )
+    for batch in batches:
+        _add_batch(vectorstore, *batch)
+    return vectorstore, params
+
+
+def _fill_index(vectorstore, params: dict, embeddings, index_type: str, batches):
+    """
+    Добавляет пакеты batches в vectorstore; при vectorstore=None создает индекс index_type.
+
+    Индексу из TRAINED_TYPES нужны векторы для обучения: до TRAIN_SIZE векторов
+    копятся в памяти, затем индекс обучается на них, и дальше пакеты добавляются
+    по мере готовности. Возвращает (vectorstore, params, число чанков).
+    """
+    pending = []
+    pending_count = 0
+    embedded = 0
+    train_size = TRAIN_SIZE if index_type in TRAINED_TYPES else 1
+    for batch in batches:
+        embedded += len(batch[0])
+        if vectorstore is not None:
+            _add_batch(vectorstore, *batch)
+            continue
+        pending.append(batch)
+        pending_count += len(batch[0])
+        if pending_count >= train_size:
+            vectorstore, params = _new_vectorstore(embeddings, index_type, pending)
+            pending = []
+    if pending:
+        vectorstore, params = _new_vectorstore(embeddings, index_type, pending)
+    return vectorstore, params, embedded
+
+
+def build_index(
+    embeddings,
+    docs_path: str = DOCS_PATH,
+    chunk_size: int = CHUNK_SIZE,
+    chunk_overlap: int = CHUNK_OVERLAP,
+    index_dir: str = INDEX_DIR,
+    index_type: str = DEFAULT_INDEX_TYPE,
+):
+    """
+    Загружает сохраненный FAISS-индекс и приводит его в соответствие с docs_path.
+
+    Для каждого файла в манифесте хранится sha256 содержимого и id его чанков.
+    Эмбеддинги считаются только для чанков новых и измененных файлов, чанки
+    измененных и удаленных файлов удаляются из индекса. Если файлы не менялись,
+    обращений к embeddings нет. Чанки передаются в embeddings пакетами по
+    EMBED_BATCH_SIZE по мере разбиения файлов (iter_file_splits).
+
+    Индекс строится заново, если выбран другой index_type, если из индекса
+    типа REBUILD_ON_DELETE нужно удалить чанки, если корпус перерос выборку,
+    на которой индекс обучен (needs_retrain), или если манифест не совпадает
+    с чанками индекса. Векторы неизмененных чанков при
+    этом берутся из кэша эмбеддингов.
+
+    Возвращает (vectorstore, stats), где stats — {"added", "changed", "removed",
+    "unchanged", "embedded", "rebuilt", "index"}. vectorstore отображен в память
+    (load_vectorstore с mmap=True) и равен None, если документов нет.
+    """
+    path = index_path(docs_path, chunk_size, chunk_overlap, index_dir, embeddings_name(embeddings))
+    # Манифест и индекс берутся из одного поколения
+    params = load_index_params(path)
+    manifest = load_manifest(path, params)
+
+    current = hash_files(docs_path, list_doc_files(docs_path))
+    stats = {
+        "added": 0, "changed": 0, "removed": 0, "unchanged": 0, "embedded": 0,
+        "rebuilt": False, "index": params["factory"],
+    }
+
+    stale_ids = []
+    for relpath, entry in manifest.items():
+        if relpath not in current:
+            stats["removed"] += 1
+            stale_ids.extend(entry["ids"])
+        elif current[relpath] != entry["hash"]:
+            stale_ids.extend(entry["ids"])
+
+    files = {}
+    to_index = []
+    for relpath, digest in current.items():
+        if relpath in manifest and manifest[relpath]["hash"] == digest:
+            stats["unchanged"] += 1
+            files[relpath] = manifest[relpath]
+        else:
+            stats["changed" if relpath in manifest else "added"] += 1
+            to_index.append(relpath)
+
+    rebuild = bool(manifest) and (
+        params["type"] != index_type or (bool(stale_ids) and index_type in REBUILD_ON_DELETE)
+    )
+    if not rebuild and not stale_ids and not to_index:
+        return (load_vectorstore(path, embeddings, mmap=True) if manifest else None), stats
+
+    vectorstore = None
+    if manifest and not rebuild:
+        vectorstore = load_vectorstore(path, embeddings, params=params)
+        # Индекс прежнего формата мог сохраниться без своего манифеста (прерванное
+        # сохранение): delete() и add_embeddings() упадут на таких id — строим заново
+        known_ids = {doc_id for entry in manifest.values() for doc_id in entry["ids"]}
+        if known_ids != set(vectorstore.index_to_docstore_id.values()):
+            vectorstore = None
+            rebuild = True
+
+    if vectorstore is not None and stale_ids:
+        vectorstore.delete(stale_ids)
+
+    if not rebuild:
+        vectorstore, params, stats["embedded"] = _fill_index(
+            vectorstore, params, embeddings, index_type,
+            _embedded_batches(embeddings, docs_path, to_index, current, files, chunk_size, chunk_overlap),
+        )
+        rebuild = vectorstore is not None and needs_retrain(params, vectorstore.index.ntotal)
+
+    if rebuild:
+        files = {}
+        vectorstore, params, embedded = _fill_index(
+            None, {}, embeddings, index_type,
+            _embedded_batches(embeddings, docs_path, list(current), current, files, chunk_size, chunk_overlap),
+        )
+        stats["embedded"] += embedded
+        stats["rebuilt"] = True
+
+    # Файлы, давшие ноль чанков (пустые), остаются в манифесте без ids
+    if not files or vectorstore is None:
+        # Все документы удалены: пустой индекс не сохраняем, тип индекса остается
+        if os.path.isdir(path):
+            save_index_params(path, {key: value for key, value in params.items() if key != "generation"})
+            _remove_generations(path)
+        return None, stats
+
+    save_vectorstore(path, vectorstore, params, files)
+    stats["index"] = params["factory"]
+    # Изменяемая копия больше не нужна: возвращаем индекс, отображенный с диска
+    return load_vectorstore(path, embeddings, mmap=True), stats
+
+
+def format_index_stats(stats: dict) -> str:
+    """Краткий отчет об индексации для st.success."""
+    return (
+        f"новых файлов: {stats['added']}, измененных: {stats['changed']}, "
+        f"удаленных: {stats['removed']}, без изменений: {stats['unchanged']}; "
+        f"чанков отправлено в embeddings: {stats['embedded']}; "
+        f"индекс: {stats['index']}{' (построен заново)' if stats['rebuilt'] else ''}"
+    )
+
+
+def current_index_type(
+    embeddings,
+    docs_path: str = DOCS_PATH,
+    chunk_size: int = CHUNK_SIZE,
+    chunk_overlap: int = CHUNK_OVERLAP,
+    index_dir: str = INDEX_DIR,
+) -> str:
+    """Тип сохраненного индекса — значение по умолчанию для выбора в интерфейсе."""
+    path = index_path(docs_path, chunk_size, chunk_overlap, index_dir, embeddings_name(embeddings))
+    return load_index_params(path)["type"]
+
+
+def _registry_key(docs_path: str, chunk_size: int, chunk_overlap: int, embeddings) -> tuple:
+    return os.path.abspath(docs_path), chunk_size, chunk_overlap, embeddings_name(embeddings)
+
+
+def _build_lock(key: tuple) -> threading.Lock:
+    with _registry_lock:
+        return _build_locks.setdefault(key, threading.Lock())
+
+
+def shared_index(
+    embeddings,
+    docs_path: str = DOCS_PATH,
+    chunk_size: int = CHUNK_SIZE,
+    chunk_overlap: int = CHUNK_OVERLAP,
+    index_dir: str = INDEX_DIR,
+):
+    """
+    Общий на процесс индекс для docs_path, параметров разбиения и модели эмбеддингов или None.
+
+    Первое обращение отображает сохраненный индекс в память (load_vectorstore
+    с mmap=True, без эмбеддингов), дальше все сессии получают один и тот же
+    объект. Индекс используется только для чтения: reindex() строит новый
+    объект и подменяет его целиком.
+    """
+    key = _registry_key(docs_path, chunk_size, chunk_overlap, embeddings)
+    vectorstore = _registry.get(key)
+    if vectorstore is not None:
+        return vectorstore
+
+    with _build_lock(key):
+        if key in _registry:
+            return _registry[key]
+        path = index_path(docs_path, chunk_size, chunk_overlap, index_dir, embeddings_name(embeddings))
+        if not load_manifest(path):
+            return None
+        vectorstore = load_vectorstore(path, embeddings, mmap=True)
+        with _registry_lock:
+            _registry[key] = vectorstore
+        return vectorstore
+
+
+def shared_retriever(
+    embeddings,
+    docs_path: str = DOCS_PATH,
+    chunk_size: int = CHUNK_SIZE,
+    chunk_overlap: int = CHUNK_OVERLAP,
+    k: int = 2,
+    hybrid: bool = False,
+):
+    """
+    Retriever поверх shared_index() или None, если документы еще не проиндексированы.
+
+    hybrid=True — HybridRetriever (BM25 + FAISS), точные идентификаторы
+    находятся без обращения к embeddings.
+    """
+    vectorstore = shared_index(embeddings, docs_path, chunk_size, chunk_overlap)
+    if vectorstore is None:
+        return None
+    if hybrid:
+        return hybrid_retriever(vectorstore, k=k)
+    return vectorstore.as_retriever(search_kwargs={"k": k})
+
+
+def reindex(
+    embeddings,
+    docs_path: str = DOCS_PATH,
+    chunk_size: int = CHUNK_SIZE,
+    chunk_overlap: int = CHUNK_OVERLAP,
+    index_dir: str = INDEX_DIR,
+    index_type: str = DEFAULT_INDEX_TYPE,
+):
+    """
+    Обновляет индекс через build_index() и публикует его для всех сессий.
+
+    Одновременные запросы на индексацию одного каталога выполняются по очереди;
+    сессии продолжают читать прежний индекс, пока новый не готов.
+    Возвращает (vectorstore, stats), как build_index().
+    """
+    key = _registry_key(docs_path, chunk_size, chunk_overlap, embeddings)
+    with _build_lock(key):
+        vectorstore, stats = build_index(
+            embeddings, docs_path, chunk_size, chunk_overlap, index_dir, index_type
+        )
+        with _registry_lock:
+            if vectorstore is None:
+                _registry.pop(key, None)
+            else:
+                _registry[key] = vectorstore
+        return vectorstore, stats
@@ -0,0 +1,135 @@
+import hashlib
+import os
+import re
+import sqlite3
+import time
+from contextlib import closing, contextmanager
+
+
+# Файл кэша, время жизни записи (секунды) и максимальное число записей
+SEVERITY_CACHE_PATH = "./cache/severity.db"
+SEVERITY_CACHE_TTL = 7 * 24 * 3600
+SEVERITY_CACHE_MAX_ENTRIES = 50000
+
+# Изменяющиеся части сообщений, которые не влияют на критичность
+_TEMPLATE_PATTERNS = [
+    (re.compile(r"\b(?:\d{1,3}\.){3}\d{1,3}\b"), "<ip>"),
+    (re.compile(r"\b(?:[0-9a-f]{4}\.){2}[0-9a-f]{4}\b", re.IGNORECASE), "<mac>"),
+    (re.compile(r"\b0x[0-9a-f]+\b", re.IGNORECASE), "<hex>"),
+    (re.compile(r"\b[A-Za-z-]+\d+(?:/\d+)+(?:\.\d+)?\b"), "<if>"),
+    (re.compile(r"\d+"), "<n>"),
+]
+
+
+def message_template(message: str) -> str:
+    """
+    Приводит сообщение к шаблону: IP, MAC, интерфейсы и числа заменяются метками.
+
+    Пример: "Received BPDU on port GigabitEthernet1/0/4" -> "Received BPDU on port <if>"
+    """
+    for pattern, placeholder in _TEMPLATE_PATTERNS:
+        message = pattern.sub(placeholder, message)
+    return " ".join(message.split())
+
+
+def severity_cache_key(log: dict, model_name: str) -> str:
+    """Ключ кэша: модель + event_type + набор шаблонов сообщений."""
+    templates = sorted({message_template(item["message"]) for item in log["items"]})
+    raw = "\n".join([model_name, log["event_type"], *templates])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class SeverityCache:
+    """
+    Постоянный кэш оценок критичности в SQLite.
+
+    Записи старше ttl секунд считаются устаревшими, при превышении max_entries
+    удаляются записи, к которым дольше всего не обращались.
+    Счетчики hits/misses накапливаются за время жизни объекта.
+    """
+
+    def __init__(
+        self,
+        path: str = SEVERITY_CACHE_PATH,
+        ttl: int = SEVERITY_CACHE_TTL,
+        max_entries: int = SEVERITY_CACHE_MAX_ENTRIES,
+    ):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS severity ("
+                " key TEXT PRIMARY KEY,"
+                " event_type TEXT NOT NULL,"
+                " severity TEXT NOT NULL,"
+                " created_at REAL NOT NULL,"
+                " accessed_at REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS severity_accessed_at ON severity (accessed_at)"
+            )
+
+    @contextmanager
+    def _connect(self):
+        # with sqlite3.Connection только фиксирует или откатывает транзакцию,
+        # соединение закрывается отдельно через closing()
+        with closing(sqlite3.connect(self.path, timeout=10)) as conn, conn:
+            yield conn
+
+    def get_many(self, keys: list) -> dict:
+        """Возвращает {key: severity} для найденных и не устаревших ключей."""
+        found = {}
+        now = time.time()
+        with self._connect() as conn:
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = conn.execute(
+                    f"SELECT key, severity FROM severity"
+                    f" WHERE key IN ({placeholders}) AND created_at >= ?",
+                    [*chunk, now - self.ttl],
+                ).fetchall()
+                found.update(rows)
+            conn.executemany(
+                "UPDATE severity SET accessed_at = ? WHERE key = ?",
+                [(now, key) for key in found],
+            )
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, entries: list) -> None:
+        """Сохраняет список (key, event_type, severity) и применяет вытеснение."""
+        now = time.time()
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO severity"
+                " (key, event_type, severity, created_at, accessed_at)"
+                " VALUES (?, ?, ?, ?, ?)",
+                [(key, event_type, severity, now, now) for key, event_type, severity in entries],
+            )
+            conn.execute("DELETE FROM severity WHERE created_at < ?", (now - self.ttl,))
+            conn.execute(
+                "DELETE FROM severity WHERE key IN ("
+                " SELECT key FROM severity ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def size(self) -> int:
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM severity").fetchone()[0]
+
+    def stats(self) -> dict:
+        """Счетчики попаданий и промахов кэша."""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "size": self.size(),
+        }
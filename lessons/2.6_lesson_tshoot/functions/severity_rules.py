@@ -0,0 +1,71 @@
+import re
+from functools import lru_cache
+
+
+# Формат Cisco: FACILITY-SEVERITY-MNEMONIC, например SPANTREE-2-BLOCK_BPDUGUARD
+MNEMONIC_RE = re.compile(r"^(?P<facility>[A-Z0-9_]+)-(?P<level>[0-7])-(?P<mnemonic>[A-Z0-9_]+)$")
+
+# Явные правила по event_type, проверяются раньше уровня из мнемоники.
+# Порядок важен: срабатывает первое совпадение.
+SEVERITY_RULES = [
+    (r"^(LINK|LINEPROTO)-\d-(UPDOWN|CHANGED)$", "low"),
+    (r"^SYS-\d-(CONFIG_I|LOGOUT|CLOCKUPDATE|TTY_EXPIRE_TIMER)$", "low"),
+    (r"^SSH-\d-SSH2_(SESSION|CLOSE|USERAUTH)$", "low"),
+    (r"^(DOT1X|MAB)-\d-(FAIL|SUCCESS)$", "low"),
+    (r"^ILPOWER-\d-(DETECT|POWER_GRANTED|IEEE_DISCONNECT)$", "low"),
+    (r"^SEC_LOGIN-\d-LOGIN_FAILED$", "mid"),
+    (r"^SW_MATM-\d-MACFLAP_NOTIF$", "mid"),
+    (r"^SFF8472-\d-THRESHOLD_VIOLATION$", "mid"),
+    (r"^SPANTREE-\d-(BLOCK_BPDUGUARD|LOOPGUARD_BLOCK|ROOTGUARD_BLOCK)$", "high"),
+    (r"^SYS-\d-CPUHOG$", "high"),
+    (r"^(PLATFORM_ENV|ENVIRONMENT)-\d-.*(FAN|PSU|POWER|TEMP).*$", "high"),
+]
+
+COMPILED_RULES = [(re.compile(pattern), severity) for pattern, severity in SEVERITY_RULES]
+
+# Уровни syslog, по которым критичность очевидна. Уровни 3-4 (error, warning)
+# сильно зависят от контекста и отправляются в LLM.
+LEVEL_SEVERITY = {
+    "0": "high",
+    "1": "high",
+    "2": "high",
+    "5": "low",
+    "6": "low",
+    "7": "low",
+}
+
+
+@lru_cache(maxsize=4096)
+def rule_severity(event_type: str):
+    """
+    Определяет критичность по правилам без обращения к LLM.
+
+    Возвращает 'low', 'mid', 'high' или None, если событие неоднозначное.
+    """
+    for pattern, severity in COMPILED_RULES:
+        if pattern.match(event_type):
+            return severity
+
+    match = MNEMONIC_RE.match(event_type)
+    if match:
+        return LEVEL_SEVERITY.get(match.group("level"))
+    return None
+
+
+def preclassify(logs: list):
+    """
+    Разделяет события на определенные правилами и требующие LLM.
+
+    Возвращает кортеж (severity_map, remaining), где severity_map — оценки по
+    правилам, remaining — события для LLM. len(severity_map) — число
+    сэкономленных запросов к LLM.
+    """
+    severity_map = {}
+    remaining = []
+    for log in logs:
+        severity = rule_severity(log.get("event_type", ""))
+        if severity is None:
+            remaining.append(log)
+        else:
+            severity_map[log["event_type"]] = severity
+    return severity_map, remaining
@@ -0,0 +1,91 @@
+import re
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+
+# Начало финального ответа агента STRUCTURED_CHAT: {"action": "Final Answer", "action_input": "...
+FINAL_ANSWER_RE = re.compile(r'"action"\s*:\s*"Final Answer"\s*,\s*"action_input"\s*:\s*"')
+
+_JSON_ESCAPES = {"n": "\n", "t": "\t", "r": "\r", "b": "\b", "f": "\f"}
+
+# Курсор в конце текста, пока ответ еще генерируется
+CURSOR = "▌"
+
+
+def decode_partial_json_string(raw: str) -> str:
+    """
+    Декодирует начало JSON-строки (без открывающей кавычки), которая еще не дописана.
+
+    Разбор останавливается на закрывающей кавычке или на незаконченной escape-последовательности.
+    """
+    out = []
+    i = 0
+    while i < len(raw):
+        char = raw[i]
+        if char == '"':
+            break
+        if char != "\\":
+            out.append(char)
+            i += 1
+            continue
+        if i + 1 >= len(raw):
+            break
+        escape = raw[i + 1]
+        if escape == "u":
+            if i + 6 > len(raw):
+                break
+            out.append(chr(int(raw[i + 2:i + 6], 16)))
+            i += 6
+        else:
+            out.append(_JSON_ESCAPES.get(escape, escape))
+            i += 2
+    return "".join(out)
+
+
+class StreamlitTokenHandler(BaseCallbackHandler):
+    """
+    Выводит токены LLM в элемент Streamlit (обычно st.empty()) по мере генерации.
+
+    Токены приходят, только если модель создана со streaming=True. Вызовы
+    с function calling дают пустые токены, поэтому у агента OPENAI_FUNCTIONS
+    на экран попадает только финальный ответ.
+    """
+
+    def __init__(self, container):
+        self.container = container
+        self.text = ""
+
+    def on_llm_new_token(self, token: str, **kwargs) -> None:
+        if not token:
+            return
+        self.text += token
+        self.container.markdown(self.text + CURSOR)
+
+
+class FinalAnswerStreamHandler(BaseCallbackHandler):
+    """
+    Выводит по мере генерации только финальный ответ агента STRUCTURED_CHAT.
+
+    Ответ модели копится по run_id; как только в нем появляется действие
+    "Final Answer", содержимое action_input декодируется и показывается
+    в container. Промежуточные шаги с инструментами на экран не попадают.
+    """
+
+    def __init__(self, container):
+        self.container = container
+        self.text = ""
+        self._buffers = {}
+
+    def on_llm_new_token(self, token: str, *, run_id, **kwargs) -> None:
+        buffer = self._buffers.get(run_id, "") + token
+        self._buffers[run_id] = buffer
+        match = FINAL_ANSWER_RE.search(buffer)
+        if not match:
+            return
+        text = decode_partial_json_string(buffer[match.end():])
+        if text != self.text:
+            self.text = text
+            self.container.markdown(text + CURSOR)
+
+    def on_llm_end(self, response, *, run_id, **kwargs) -> None:
+        self._buffers.pop(run_id, None)
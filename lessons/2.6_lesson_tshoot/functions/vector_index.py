@@ -0,0 +1,137 @@
+import faiss
+import numpy as np
+
+
+# Типы FAISS-индекса: название -> строка для faiss.index_factory.
+# Flat — точный поиск, остальные — приближенные, но быстрее и/или компактнее:
+# SQ8 — 1 байт на измерение (в 4 раза меньше памяти), IVF — поиск только по
+# nprobe ближайшим кластерам из nlist, IVF-PQ — IVF со сжатием вектора до m байт,
+# HNSW — граф ближайших соседей (быстрый поиск, памяти больше, чем у Flat).
+INDEX_TYPES = {
+    "Flat": "Flat",
+    "SQ8": "SQ8",
+    "IVF": "IVF{nlist},Flat",
+    "IVF-PQ": "IVF{nlist},PQ{m}",
+    "HNSW": "HNSW{hnsw_m}",
+}
+DEFAULT_INDEX_TYPE = "Flat"
+
+# Подсказка к выбору типа индекса в интерфейсе: построение идет синхронно по нажатию
+# "Индексировать", время обучения замерено на одном ядре для векторов 384 измерений
+INDEX_TYPE_HELP = (
+    "Flat — точный поиск, строится мгновенно. "
+    "SQ8 — в 4 раза меньше памяти, обучение за доли секунды. "
+    "HNSW — быстрый поиск, памяти больше, чем у Flat; без обучения, но добавление медленнее. "
+    "IVF — поиск по части кластеров, обучение до ~20–30 с. "
+    "IVF-PQ — сжатие до 64 байт на вектор, обучение ~40–60 с на одном ядре. "
+    "Обучение выполняется один раз при построении (и при перестроении, когда корпус вырос)."
+)
+
+# Параметры IVF: число кластеров (не больше), сколько из них просматривать при поиске
+# и сколько векторов обучения нужно на кластер
+IVF_NLIST = 1024
+IVF_NPROBE = 16
+IVF_MIN_POINTS_PER_LIST = 39
+
+# PQ: байт на вектор (не больше; число должно делить размерность, а в каждой
+# части вектора — не меньше PQ_MIN_SUBVECTOR_DIM измерений) и минимум векторов
+# для обучения 256 центроидов каждой части; на меньшем корпусе сжатие не нужно.
+# Кодовые книги PQ обучаются не больше чем на PQ_MIN_TRAIN векторах, даже если
+# IVF обучается на TRAIN_SIZE: обучение PQ — самая долгая часть построения
+PQ_M = 64
+PQ_MIN_SUBVECTOR_DIM = 4
+PQ_MIN_TRAIN = 256 * IVF_MIN_POINTS_PER_LIST
+
+# HNSW: связей на узел, ширина поиска при построении и при запросе
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 80
+HNSW_EF_SEARCH = 64
+
+# Индексы, которым нужно обучение: обучаются на первых TRAIN_SIZE векторах.
+# Если корпус вырос в RETRAIN_GROWTH раз от числа векторов обучения, индекс строится заново
+TRAINED_TYPES = {"SQ8", "IVF", "IVF-PQ"}
+TRAIN_SIZE = IVF_NLIST * IVF_MIN_POINTS_PER_LIST
+RETRAIN_GROWTH = 4
+
+# remove_ids у IVF не перенумеровывает векторы (FAISS в LangChain на это рассчитывает),
+# у HNSW не поддерживается: после удаления чанков такие индексы строятся заново
+REBUILD_ON_DELETE = {"IVF", "IVF-PQ", "HNSW"}
+
+
+def create_index(index_type: str, sample: np.ndarray):
+    """
+    Создает пустой индекс index_type, обученный на sample (float32, n x dim).
+
+    nlist и m подбираются под размер выборки и размерность. Если векторов
+    слишком мало для обучения PQ, используется точный Flat. Возвращает
+    (index, params); params сохраняются рядом с индексом и применяются
+    при загрузке (configure_search).
+    """
+    n, dim = sample.shape
+    params = {"type": index_type, "trained_on": n}
+    if index_type in ("IVF", "IVF-PQ"):
+        params["nlist"] = max(1, min(IVF_NLIST, n // IVF_MIN_POINTS_PER_LIST))
+        params["nprobe"] = min(IVF_NPROBE, params["nlist"])
+    if index_type == "IVF-PQ":
+        params["m"] = max(
+            (m for m in range(1, PQ_M + 1) if dim % m == 0 and dim // m >= PQ_MIN_SUBVECTOR_DIM),
+            default=1,
+        )
+    if index_type == "HNSW":
+        params["hnsw_m"] = HNSW_M
+        params["ef_search"] = HNSW_EF_SEARCH
+
+    if index_type == "IVF-PQ" and n < PQ_MIN_TRAIN:
+        params = {"type": index_type, "trained_on": n, "factory": "Flat"}
+    else:
+        params["factory"] = INDEX_TYPES[index_type].format(**params)
+
+    index = faiss.index_factory(dim, params["factory"])
+    if hasattr(index, "hnsw"):
+        index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+    if isinstance(index, faiss.IndexIVFPQ):
+        # index_factory включает polysemous-обучение (в разы дольше обучения PQ),
+        # а поиск polysemous не использует
+        index.do_polysemous_training = False
+        index.pq.cp.max_points_per_centroid = IVF_MIN_POINTS_PER_LIST
+    if not index.is_trained:
+        index.train(sample)
+    configure_search(index, params)
+    return index, params
+
+
+def configure_search(index, params: dict) -> None:
+    """Применяет параметры поиска (nprobe, efSearch) к индексу, загруженному с диска."""
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None and "nprobe" in params:
+        ivf.nprobe = params["nprobe"]
+    if hasattr(index, "hnsw") and "ef_search" in params:
+        index.hnsw.efSearch = params["ef_search"]
+
+
+def needs_retrain(params: dict, ntotal: int) -> bool:
+    """Индекс обучен на выборке, которая мала для текущего числа векторов ntotal."""
+    return (
+        params.get("type") in TRAINED_TYPES
+        and params["trained_on"] < TRAIN_SIZE
+        and ntotal >= RETRAIN_GROWTH * max(1, params["trained_on"])
+    )
+
+
+def index_memory_bytes(index) -> int:
+    """Размер сериализованного индекса — оценка занимаемой им памяти."""
+    return faiss.serialize_index(index).nbytes
+
+
+def mmap_io_flags(params: dict) -> int:
+    """
+    Флаги faiss.read_index, чтобы отобразить сохраненный индекс в память, а не копировать.
+
+    У IVF отображаются инвертированные списки (IO_FLAG_MMAP), у Flat, SQ8
+    и HNSW — массив векторов (IO_FLAG_MMAP_IFC); граф HNSW читается в память.
+    В такой индекс нельзя добавлять векторы.
+    """
+    if params["factory"].startswith("IVF"):
+        return faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY
+    # IO_FLAG_MMAP_IFC есть только в новых версиях faiss, без него индекс читается целиком
+    return getattr(faiss, "IO_FLAG_MMAP_IFC", 0) | faiss.IO_FLAG_READ_ONLY
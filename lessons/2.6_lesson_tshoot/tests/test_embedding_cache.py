@@ -0,0 +1,36 @@
+import numpy as np
+
+from functions.embedding_cache import EmbeddingCache
+
+
+MODEL = "test-model"
+
+
+def vector(value: float) -> list:
+    return [value] * 4
+
+
+def test_put_many_keeps_existing_keys_when_full(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), max_entries=4)
+    cache.put_many(MODEL, [(f"k{i}", vector(i)) for i in range(4)])
+
+    # k0 — самый давний, но он есть в пакете и не должен уступить слот n1
+    cache.put_many(MODEL, [("k0", vector(100)), ("n1", vector(1000))])
+
+    found = cache.get_many(MODEL, ["k0", "n1", "k1", "k2", "k3"])
+    assert np.allclose(found["k0"], vector(100))
+    assert np.allclose(found["n1"], vector(1000))
+    assert len(found) == 4
+    assert cache.size() == 4
+
+
+def test_put_many_slots_stay_unique(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), max_entries=8)
+    for batch in range(5):
+        cache.put_many(MODEL, [(f"k{i}", vector(batch * 10 + i)) for i in range(batch, batch + 6)])
+
+    found = cache.get_many(MODEL, [f"k{i}" for i in range(12)])
+    assert len(found) == 8
+    for key, value in found.items():
+        i = int(key[1:])
+        assert np.allclose(value, vector(min(i, 4) * 10 + i))